@@ -0,0 +1,13 @@
+# Beatport chart tracker.
+#
+#   beatracks.store   SQLite schema, migrations and queries (stdlib only)
+#   beatracks.fetch   pooled HTTP session and on-disk response cache
+#   beatracks.parse   chart/label page parsing (embedded JSON, lxml, BeautifulSoup)
+#   beatracks.ingest  chart URL collection and the threaded/async ingest pipelines
+#   beatracks.images  content-addressed local image mirror with thumbnails
+#   beatracks.render  index.html / sharded output (stdlib only)
+#   beatracks.server  local HTTP server: the site plus a full-text search API (stdlib only)
+#   beatracks.cli     `python -m beatracks [ingest|images|render|serve|all]`
+#
+# Submodules are not imported here, so `import beatracks.render` never pulls in
+# requests, bs4 or lxml.
@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from . import render, store
+from .metrics import run_counters, run_timings, timed
+
+# ============================
+# Run settings
+# ============================
+RUN_REPORT_FILE = os.getenv("RUN_REPORT_FILE", os.path.join(os.path.dirname(render.OUTPUT_FILE), "run-report.json"))
+# PROFILE=<file> runs main() under cProfile and dumps the stats there
+PROFILE_FILE = os.getenv("PROFILE", "")
+# IMAGE_MIRROR=1 makes `all` download images into the local mirror before rendering
+IMAGE_MIRROR = os.getenv("IMAGE_MIRROR", "").strip().lower() not in ("", "0", "false", "no")
+# DISCOVER_URLS=<listing ...> makes `all` also crawl those listings for new charts
+DISCOVER = bool(os.getenv("DISCOVER_URLS", "").strip())
+
+# ============================
+# Run report
+# ============================
+def write_run_report(command, started_at, seconds):
+    config = {"command": command, "output_mode": render.OUTPUT_MODE}
+    if command in ("ingest", "discover", "all"):
+        from . import fetch, ingest, parse
+        config.update(pipeline=ingest.PIPELINE, parser=parse.parser_backend(),
+                      chart_extract=parse.CHART_EXTRACT, offline=fetch.OFFLINE,
+                      fetch_workers=fetch.FETCH_WORKERS, label_workers=fetch.LABEL_WORKERS,
+                      per_host_limit=fetch.PER_HOST_LIMIT, rate_limit=fetch.RATE_LIMIT)
+    report = {
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "seconds": round(seconds, 3),
+        "config": config,
+        "stages": {stage: {"calls": calls, "seconds": round(secs, 4)}
+                   for stage, (calls, secs) in sorted(run_timings.items())},
+        "counters": dict(sorted(run_counters.items())),
+        "data": dict(store.data_sizes(), output_bytes=render.output_bytes()),
+    }
+    with open(RUN_REPORT_FILE, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"📊 Run report saved to {RUN_REPORT_FILE} ({seconds:.1f}s)")
+
+# ============================
+# Commands: ingest, discover, images, render, backfill, serve, all
+# ============================
+COMMANDS = ("ingest", "discover", "images", "render", "backfill", "serve", "all")
+
+def run_ingest(urls, listings=None):
+    # Imported here so render-only runs never load requests, bs4 or lxml
+    from . import ingest
+    # urls=None: discovered charts only; listings=None: no discovery crawl
+    with timed("collect"):
+        input_links = ingest.collect_chart_urls(urls) if urls is not None else []
+    if listings is not None:
+        with timed("discover"):
+            input_links += [u for u in ingest.discover_chart_urls(listings) if u not in input_links]
+    print(f"📋 Processing {len(input_links)} chart(s)")
+    with timed("ingest"):
+        ingest.ingest_charts(input_links)
+
+def run_images():
+    from . import images
+    with timed("images"):
+        images.mirror_images()
+
+def run_backfill():
+    with timed("backfill"):
+        keys, flags = store.backfill_track_identity()
+        indexed = store.rebuild_track_search()
+    print(f"🧬 Track identity backfill: {keys} key(s) and {flags} duplicate flag(s) updated")
+    if indexed is None:
+        print("⚠️  SQLite has no FTS5 - full-text search index not built")
+    else:
+        print(f"🔎 Search index rebuilt ({indexed} tracks)")
+
+def run_render():
+    with timed("render"):
+        render.render_site()
+
+def run_serve(args):
+    # Long-running and read-only: no run report
+    from . import server
+    server.serve(args.host, args.port)
+
+def run(args):
+    if args.command == "serve":
+        return run_serve(args)
+    started_at, start = datetime.now(), time.perf_counter()
+    store.open_db()
+    if args.command in ("ingest", "all"):
+        run_ingest(args.urls, [] if args.command == "all" and DISCOVER else None)
+    if args.command == "discover":
+        run_ingest(None, args.listings)
+    if args.command == "images" or args.command == "all" and IMAGE_MIRROR:
+        run_images()
+    if args.command == "backfill":
+        run_backfill()
+    if args.command in ("render", "all"):
+        run_render()
+    write_run_report(args.command, started_at, time.perf_counter() - start)
+    store.conn.close()
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="beatracks", description="Track Beatport charts and build index.html")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("ingest", help="fetch charts into the DB").add_argument(
+        "urls", nargs="*", help="chart or listing URLs (also read from CHART_URL, CHART_URLS, CHART_URLS_FILE)")
+    commands.add_parser("discover", help="crawl listing pages for charts not seen before and ingest them").add_argument(
+        "listings", nargs="*", help="listing URLs, e.g. a genre's or curator's charts page (also read from DISCOVER_URLS)")
+    commands.add_parser("images", help="download chart, track and label images into the local mirror")
+    commands.add_parser("render", help="rebuild the site from the DB")
+    commands.add_parser("backfill", help="recompute track identity keys, duplicate flags and the search index for the whole DB")
+    serve = commands.add_parser("serve", help="serve the site plus a JSON search API over the DB on a local port")
+    serve.add_argument("--host", default=None, help="bind address (default SERVE_HOST or 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=None, help="port (default SERVE_PORT or 8000)")
+    commands.add_parser("all", help="ingest (plus discovery if DISCOVER_URLS is set), mirror images if IMAGE_MIRROR=1, then render (default)").add_argument(
+        "urls", nargs="*", help="chart or listing URLs")
+    # Bare URLs (`python app.py <url>`) keep meaning "all <url>"
+    if not argv or argv[0] not in COMMANDS and not argv[0].startswith("-"):
+        argv = ["all"] + list(argv)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if not PROFILE_FILE:
+        return run(args)
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    profiler.runcall(run, args)
+    profiler.dump_stats(PROFILE_FILE)
+    pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
@@ -0,0 +1,236 @@
+import gzip
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+import requests.adapters
+
+from .metrics import count, timed
+
+# ============================
+# Fetch settings
+# ============================
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "8"))
+# Upper bound on requests in flight per host; the actual limit adapts between 1 and this
+PER_HOST_LIMIT = int(os.getenv("PER_HOST_LIMIT", "4"))
+LABEL_WORKERS = int(os.getenv("LABEL_WORKERS", "10"))
+# Token bucket per host: RATE_LIMIT requests/second on average, bursts of RATE_BURST
+RATE_LIMIT = float(os.getenv("RATE_LIMIT", "10"))
+RATE_BURST = float(os.getenv("RATE_BURST", "20"))
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "10"))
+# Retries after a network error, 429 or 5xx, with jittered exponential backoff
+FETCH_RETRIES = int(os.getenv("FETCH_RETRIES", "4"))
+BACKOFF_BASE = float(os.getenv("BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("BACKOFF_MAX", "30"))
+# After BREAKER_THRESHOLD failed requests in a row a host gets no requests for BREAKER_COOLDOWN seconds
+BREAKER_THRESHOLD = int(os.getenv("BREAKER_THRESHOLD", "8"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "60"))
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", ".http_cache")
+# OFFLINE=1 serves every page from HTTP_CACHE_DIR and never touches the network
+OFFLINE = os.getenv("OFFLINE", "").strip().lower() not in ("", "0", "false", "no")
+
+# ============================
+# HTTP client: pooled keep-alive session, per-host scheduling, on-disk response cache
+# ============================
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+host_limiters = {}
+host_limiters_lock = threading.Lock()
+http_session = None
+http_session_lock = threading.Lock()
+
+class OfflineCacheMiss(Exception):
+    pass
+
+class CircuitOpen(Exception):
+    pass
+
+def permanent_error(e):
+    # The server answered that the page is not there (404, 410, ...): asking again will not help.
+    # Throttling, 5xx, network errors and an open circuit are transient.
+    return (isinstance(e, requests.HTTPError) and e.response is not None
+            and e.response.status_code < 500 and e.response.status_code not in RETRY_STATUSES)
+
+class HostLimiter:
+    # Token-bucket rate limit, adaptive concurrency (halved on 429/5xx, +1 after a run of
+    # successes) and a circuit breaker, shared by every thread requesting from one host
+    def __init__(self, host):
+        self.host = host
+        self.cond = threading.Condition()
+        self.tokens = RATE_BURST
+        self.refilled = time.monotonic()
+        self.limit = PER_HOST_LIMIT
+        self.active = 0
+        self.successes = 0
+        self.failures = 0
+        self.resume_at = 0.0
+        self.open_until = 0.0
+
+    def acquire(self):
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                if now < self.open_until:
+                    raise CircuitOpen(f"{self.host}: {self.failures + 1} failed requests in a row, paused")
+                self.tokens = min(RATE_BURST, self.tokens + (now - self.refilled) * RATE_LIMIT)
+                self.refilled = now
+                if now >= self.resume_at and self.active < self.limit and self.tokens >= 1:
+                    self.tokens -= 1
+                    self.active += 1
+                    return
+                wait = None
+                if now < self.resume_at:
+                    wait = self.resume_at - now
+                elif self.active < self.limit:
+                    wait = (1 - self.tokens) / RATE_LIMIT
+                self.cond.wait(wait)
+
+    def release(self, ok, throttled=False, retry_after=0.0):
+        with self.cond:
+            self.active -= 1
+            if ok:
+                self.failures = 0
+                self.successes += 1
+                if self.successes >= self.limit and self.limit < PER_HOST_LIMIT:
+                    self.limit += 1
+                    self.successes = 0
+            else:
+                self.successes = 0
+                self.failures += 1
+                if throttled:
+                    count("http_throttled")
+                    self.limit = max(1, self.limit // 2)
+                    self.resume_at = max(self.resume_at, time.monotonic() + retry_after)
+                if self.failures >= BREAKER_THRESHOLD:
+                    count("circuit_opened")
+                    print(f"  ⚠️  {self.host}: {self.failures} failed requests in a row, pausing for {BREAKER_COOLDOWN:.0f}s")
+                    self.open_until = time.monotonic() + BREAKER_COOLDOWN
+                    # Half-open afterwards: the next failure opens it again
+                    self.failures = BREAKER_THRESHOLD - 1
+            self.cond.notify_all()
+
+def host_limiter(url):
+    host = urlparse(url).netloc
+    with host_limiters_lock:
+        if host not in host_limiters:
+            host_limiters[host] = HostLimiter(host)
+        return host_limiters[host]
+
+def backoff(attempt):
+    # Full jitter: spreads retries from many workers instead of retrying in lockstep
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def retry_after(response):
+    try:
+        return min(BACKOFF_MAX, float(response.headers.get("Retry-After", 0)))
+    except ValueError:
+        return 0.0
+
+def request(url, headers=None):
+    # Returns the last response, which can still be a 429/5xx once retries run out;
+    # network errors and an open circuit are raised
+    limiter = host_limiter(url)
+    for attempt in range(FETCH_RETRIES + 1):
+        limiter.acquire()
+        try:
+            with timed("http"):
+                r = get_session().get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        except requests.RequestException:
+            limiter.release(False)
+            if attempt == FETCH_RETRIES: raise
+            delay = backoff(attempt)
+        else:
+            count("http_requests")
+            count("bytes_downloaded", len(r.content))
+            if r.status_code not in RETRY_STATUSES:
+                limiter.release(True)
+                return r
+            limiter.release(False, throttled=True, retry_after=retry_after(r))
+            if attempt == FETCH_RETRIES: return r
+            delay = max(backoff(attempt), retry_after(r))
+        count("http_retries")
+        time.sleep(delay)
+
+def get_session():
+    global http_session
+    with http_session_lock:
+        if http_session is None:
+            pool_size = max(FETCH_WORKERS, LABEL_WORKERS)
+            http_session = requests.Session()
+            http_session.headers["User-Agent"] = "Mozilla/5.0"
+            adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            http_session.mount("https://", adapter)
+            http_session.mount("http://", adapter)
+        return http_session
+
+def http_cache_paths(url):
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    base = os.path.join(HTTP_CACHE_DIR, key[:2], key)
+    return base + ".json", base + ".html.gz"
+
+def http_cache_load(url):
+    meta_path, body_path = http_cache_paths(url)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        with gzip.open(body_path, "rt", encoding="utf-8") as f:
+            return meta, f.read()
+    except (OSError, ValueError):
+        return None, None
+
+def http_cache_store(url, response):
+    meta_path, body_path = http_cache_paths(url)
+    os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+    meta = {
+        "url": url,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "fetched_at": time.time(),
+    }
+    # Write to temp files first so a concurrent reader never sees half an entry
+    suffix = f".{threading.get_ident()}.tmp"
+    with gzip.open(body_path + suffix, "wt", encoding="utf-8") as f:
+        f.write(response.text)
+    with open(meta_path + suffix, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(body_path + suffix, body_path)
+    os.replace(meta_path + suffix, meta_path)
+
+def fetch_html(url):
+    meta, body = http_cache_load(url)
+    if OFFLINE:
+        if body is None: raise OfflineCacheMiss(f"{url} is not in {HTTP_CACHE_DIR}")
+        count("http_cache_hits")
+        return body
+
+    headers = {}
+    if body is not None:
+        if meta.get("etag"): headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"): headers["If-Modified-Since"] = meta["last_modified"]
+    try:
+        r = request(url, headers)
+        r.raise_for_status()
+    except (requests.RequestException, CircuitOpen) as e:
+        # A 404 is a real answer; anything else falls back to the cached copy
+        if body is None or isinstance(e, requests.HTTPError) and e.response.status_code == 404: raise
+        count("http_stale_served")
+        return body
+    if r.status_code == 304 and body is not None:
+        count("http_cache_hits")
+        return body
+    if r.status_code == 200:
+        http_cache_store(url, r)
+    return r.text
+
+def fetch_bytes(url):
+    # Binary downloads (images) skip the HTML response cache; the image mirror keeps them
+    if OFFLINE: raise OfflineCacheMiss(f"{url} is not cached (offline)")
+    r = request(url)
+    # Missing images are an answer; throttling that outlasted the retries is raised
+    if r.status_code in RETRY_STATUSES: r.raise_for_status()
+    return r.content if r.status_code == 200 else b""
@@ -0,0 +1,98 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from . import store
+from .fetch import fetch_bytes, FETCH_WORKERS, OFFLINE
+from .metrics import count, timed
+from .render import CDN_SIZE_RE, IMAGE_DIR, LARGE_SIZE, THUMB_SIZE
+
+# ============================
+# Image mirror settings
+# ============================
+# Failed downloads are retried on the next run after this long
+IMAGE_RETRY_DAYS = float(os.getenv("IMAGE_RETRY_DAYS", "1"))
+
+# ============================
+# Content-addressed store: img/<ab>/<sha256 prefix>.<ext>, identical bytes stored once
+# ============================
+def image_ext(url):
+    ext = os.path.splitext(urlparse(url).path)[1].lower()
+    return ext if ext in (".jpg", ".jpeg", ".png", ".gif", ".webp") else ".jpg"
+
+def save_blob(data, ext):
+    digest = hashlib.sha256(data).hexdigest()
+    rel = f"{digest[:2]}/{digest[:24]}{ext}"
+    path = os.path.join(IMAGE_DIR, rel)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        count("image_files_written")
+    # Page-relative URL
+    return f"{os.path.basename(IMAGE_DIR)}/{rel}"
+
+def make_thumbnail(url, data):
+    # Resize locally when Pillow is installed, else ask the CDN for its small variant
+    if Image is not None:
+        with timed("image_resize"):
+            img = Image.open(io.BytesIO(data))
+            img.thumbnail(tuple(int(n) for n in THUMB_SIZE.split("x")))
+            buf = io.BytesIO()
+            img.convert("RGB").save(buf, "JPEG", quality=85)
+        return save_blob(buf.getvalue(), ".jpg")
+    if CDN_SIZE_RE.search(url):
+        thumb = fetch_bytes(CDN_SIZE_RE.sub(f"/image_size/{THUMB_SIZE}/", url))
+        if thumb: return save_blob(thumb, image_ext(url))
+    return ""
+
+def mirror_image(url):
+    try:
+        # Same variant the page would otherwise load from the CDN
+        data = fetch_bytes(CDN_SIZE_RE.sub(f"/image_size/{LARGE_SIZE}/", url))
+        if not data: return url, "", "", time.time()
+        large = save_blob(data, image_ext(url))
+        return url, make_thumbnail(url, data) or large, large, time.time()
+    except Exception as e:
+        # Network errors and throttling are retried on the next run, not after IMAGE_RETRY_DAYS
+        print(f"  ⚠️  Error mirroring {url}: {e}")
+        return url, "", "", 0
+
+def needs_download(entry, now):
+    if entry is None: return True
+    thumb, large, fetched_at = entry
+    if not large:
+        return now - (fetched_at or 0) > IMAGE_RETRY_DAYS * 86400
+    # Files can go missing when img/ is not kept between CI runs
+    base = os.path.dirname(IMAGE_DIR)
+    return not (os.path.exists(os.path.join(base, large)) and os.path.exists(os.path.join(base, thumb)))
+
+# ============================
+# Entry point
+# ============================
+def mirror_images():
+    if OFFLINE:
+        print("🖼️  Offline - image mirror left as is")
+        return
+    known = store.load_images()
+    now = time.time()
+    pending = [url for url in store.image_urls() if needs_download(known.get(url), now)]
+    print(f"🖼️  Mirroring {len(pending)} image(s) into {IMAGE_DIR}/ ({len(known)} known)...")
+    if not pending: return
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        rows = list(executor.map(mirror_image, pending))
+    store.save_images(rows)
+    mirrored = sum(1 for row in rows if row[2])
+    count("images_mirrored", mirrored)
+    print(f"   ✓ {mirrored}/{len(pending)} images mirrored")
@@ -0,0 +1,344 @@
+import asyncio
+import os
+import re
+import threading
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .fetch import fetch_html, permanent_error, CircuitOpen, OfflineCacheMiss, FETCH_WORKERS, LABEL_WORKERS
+from .metrics import count, timed
+from .parse import parse_chart_page, parse_label_image, parse_chart_links, parser_backend
+from . import store
+from .store import add_tracks_to_db, chart_already_exists, load_label_cache, save_label_cache
+
+# ============================
+# Ingest settings
+# ============================
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "2"))
+# "threads": fetch charts, then label images per chart; "async": all stages overlap
+PIPELINE = os.getenv("PIPELINE", "threads").strip().lower()
+# Listing pages crawled for new charts by `discover` (and by `all` when set)
+DISCOVER_URLS = [u for u in re.split(r"[\s,]+", os.getenv("DISCOVER_URLS", "")) if u]
+DISCOVER_MAX_PAGES = max(1, int(os.getenv("DISCOVER_MAX_PAGES", "10")))
+
+# ============================
+# Chart page: one fetch, one parse
+# ============================
+def ingest_chart(url):
+    return parse_chart_page(fetch_html(url))
+
+# ============================
+# Label image cache + threading
+# ============================
+label_img_cache = {}
+cache_lock = threading.Lock()
+
+def get_label_img(label, label_href):
+    # None means the lookup failed (network, throttling, open circuit): recorded as a failed
+    # label_cache row and retried on the next run instead of being cached as "no image".
+    # A missing label page (404) is an answer: "" goes through the negative TTL.
+    # Either way the result is kept for the run, so each label is requested at most once.
+    with cache_lock:
+        if label in label_img_cache:
+            return label, label_img_cache[label]
+    try:
+        with timed("label_lookup"):
+            result = parse_label_image(fetch_html("https://www.beatport.com" + label_href), label)
+    except Exception as e:
+        if permanent_error(e):
+            count("label_pages_missing")
+            result = ""
+        else:
+            count("label_lookup_errors")
+            print(f"  ⚠️  Label image lookup failed for {label} ({e}) - will retry next run")
+            result = None
+    with cache_lock:
+        label_img_cache[label] = result
+    return label, result
+
+# ============================
+# Chart URL list: env, file, CLI args or listing pages
+# ============================
+CHART_URL_RE = re.compile(r"/chart/([^/]+)/(\d+)/?$")
+
+def chart_name_from_url(url):
+    match = CHART_URL_RE.search(url)
+    return match.group(1).replace("-", " ").title() if match else url
+
+def chart_id_from_url(url):
+    match = CHART_URL_RE.search(url)
+    return int(match.group(2)) if match else None
+
+def expand_listing(url):
+    links = []
+    for href in parse_chart_links(fetch_html(url)):
+        href = urljoin(url, href).split("?")[0]
+        if CHART_URL_RE.search(href) and href not in links:
+            links.append(href)
+    print(f"🔎 Listing {url}: {len(links)} charts")
+    return links
+
+def collect_chart_urls(extra_urls=()):
+    raw = []
+    for var in ("CHART_URL", "CHART_URLS"):
+        raw += re.split(r"[\s,]+", os.getenv(var, ""))
+    urls_file = os.getenv("CHART_URLS_FILE", "").strip()
+    if urls_file:
+        with open(urls_file, encoding="utf-8") as f:
+            raw += [line.split("#")[0] for line in f]
+    raw += extra_urls
+    raw = [u.strip() for u in raw if u.strip()]
+    if not raw:
+        raw = ["https://www.beatport.com/chart/weekend-picks-2026-week-2/876342"]
+
+    urls = []
+    for u in raw:
+        try:
+            found = [u] if CHART_URL_RE.search(u) else expand_listing(u)
+        except Exception as e:
+            print(f"  ⚠️  Error reading listing {u}: {e}")
+            continue
+        urls += [x for x in found if x not in urls]
+    return urls
+
+# ============================
+# Discovery: crawl listing pages, newest first, until known charts show up
+# ============================
+def listing_page_url(url, page):
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query) if k != "page"]
+    if page > 1: query.append(("page", str(page)))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+def discover_listing(listing):
+    high_water, resume_page = store.crawl_state(listing)
+    found = {}
+    pages = 0
+    stopped_at = None
+    # Listings are newest first: the walk from page 1 ends at the first page with charts seen
+    # before. If an earlier walk stopped early (error or page cap), the charts below it are
+    # still missing, so the walk continues from resume_page down to high_water. New charts only
+    # push older ones to later pages, so the resumed walk may re-read some but never skips any.
+    walks = [(1, True)] + ([(resume_page, False)] if resume_page else [])
+    for page, stop_at_seen in walks:
+        while stopped_at is None:
+            if pages >= DISCOVER_MAX_PAGES:
+                stopped_at = page
+                break
+            try:
+                links = expand_listing(listing_page_url(listing, page))
+            except Exception as e:
+                print(f"  ⚠️  Error reading listing {listing} page {page}: {e}")
+                stopped_at = page
+                break
+            pages += 1
+            ids = {chart_id_from_url(u): u for u in links}
+            seen = store.seen_chart_ids(ids)
+            found.update((i, u) for i, u in ids.items() if i not in seen)
+            if not ids or min(ids) <= high_water or (stop_at_seen and seen):
+                break
+            page += 1
+    store.record_discovered(listing, sorted(found.items()), stopped_at)
+    count("charts_discovered", len(found))
+    resume = f", resuming at page {stopped_at} next run" if stopped_at else ""
+    print(f"🧭 {listing}: {len(found)} new chart(s) in {pages} page(s){resume}")
+    return list(found.values())
+
+def discover_chart_urls(listings=()):
+    urls = []
+    for listing in list(listings) + DISCOVER_URLS:
+        urls += [u for u in discover_listing(listing) if u not in urls]
+    # Charts found on earlier runs whose ingest failed are retried
+    urls += [u for u in store.pending_crawl_urls() if u not in urls]
+    return urls
+
+# ============================
+# Process links
+# ============================
+def unique_chart_labels(tracks_data):
+    unique_labels = {}
+    for track in tracks_data:
+        if track["label_href"] and track["label"] not in unique_labels:
+            unique_labels[track["label"]] = track["label_href"]
+    return unique_labels
+
+def cached_label_images(tracks_data):
+    # Label images known without HTTP: embedded in the chart page or in the label cache
+    unique_labels = unique_chart_labels(tracks_data)
+    from_page = {t["label"]: t["label_img"] for t in tracks_data if t.get("label_img") and t["label"] in unique_labels}
+    count("label_images_from_page", len(from_page))
+    save_label_cache(from_page, unique_labels)
+    cached = load_label_cache({l: h for l, h in unique_labels.items() if l not in from_page})
+    cached.update(from_page)
+    label_img_cache.update(cached)
+    missing = {l: h for l, h in unique_labels.items() if l not in cached}
+    return unique_labels, cached, missing
+
+def fetch_label_images(labels):
+    # {label: label_href} -> {label: label_img, or None when the lookup failed}
+    fetched = {}
+    with ThreadPoolExecutor(max_workers=LABEL_WORKERS) as executor:
+        for label_name, label_img_url in executor.map(lambda item: get_label_img(item[0], item[1]), labels.items()):
+            fetched[label_name] = label_img_url
+    return fetched
+
+def retry_failed_labels():
+    # Charts stored while a label lookup failed have no image for that label yet
+    failed = store.failed_label_lookups()
+    if not failed: return
+    print(f"🎨 Retrying {len(failed)} failed label image lookup(s)...")
+    count("label_lookup_retries", len(failed))
+    fetched = fetch_label_images(failed)
+    save_label_cache(fetched, failed)
+    store.update_label_images({label: img for label, img in fetched.items() if img})
+    print(f"   ✓ {sum(img is not None for img in fetched.values())} recovered")
+
+def chart_failed(url, error=None):
+    # Counts an attempt on a discovered chart; a run that never reached Beatport does not count
+    if isinstance(error, (CircuitOpen, OfflineCacheMiss)): return
+    if store.record_chart_failure(chart_id_from_url(url), error is not None and permanent_error(error)):
+        count("charts_given_up")
+        print(f"  🚫 Giving up on chart {url}")
+
+def store_chart(url, chart_name, chart_date_created, chart_image, tracks_data):
+    if not tracks_data:
+        # Error page or a layout we could not read: retried later, up to CRAWL_MAX_ATTEMPTS
+        print(f"  ⚠️  No tracks found for {chart_name} - will retry later")
+        chart_failed(url)
+        return 0, 0
+    for t in tracks_data:
+        t["label_img"] = t.get("label_img") or label_img_cache.get(t["label"]) or ""
+    result = add_tracks_to_db(chart_name, chart_date_created, chart_image, url, tracks_data)
+    store.mark_chart_ingested(chart_id_from_url(url), url)
+    return result
+
+def process_chart(url, chart_name, chart_date_created, chart_image, tracks_data):
+    print(f"📀 {chart_name} - Date: {chart_date_created}, Image: {'✓' if chart_image else '✗'}")
+    print(f"📀 Loading {len(tracks_data)} tracks from {chart_name} ...")
+
+    # שלב 1: לייבלים ייחודיים
+    unique_labels, cached, missing = cached_label_images(tracks_data)
+
+    # שלב 2: שליפת תמונות לייבל במקביל
+    print(f"🎨 {len(cached)} label images from page/cache, fetching {len(missing)} in parallel...")
+    fetched = fetch_label_images(missing)
+    save_label_cache(fetched, unique_labels)
+    print(f"   ✓ Label images done ({sum(img is None for img in fetched.values())} failed)")
+
+    # שלב 3: הוספה ל-DB
+    return store_chart(url, chart_name, chart_date_created, chart_image, tracks_data)
+
+def ingest_charts_threaded(pending):
+    total_added = total_skipped = 0
+    # Charts are downloaded and parsed concurrently; DB writes stay on this thread
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        futures = {executor.submit(ingest_chart, url): url for url in pending}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                chart_date_created, chart_image, tracks_data = future.result()
+            except Exception as e:
+                print(f"  ⚠️  Error fetching chart {url}: {e}")
+                chart_failed(url, e)
+                continue
+            added, skipped = process_chart(url, pending[url], chart_date_created, chart_image, tracks_data)
+            total_added += added
+            total_skipped += skipped
+    return total_added, total_skipped
+
+# ============================
+# asyncio pipeline: fetch -> parse -> label lookups -> DB write, overlapping via queues
+# ============================
+async def ingest_charts_async(pending):
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=FETCH_WORKERS + LABEL_WORKERS + PARSE_WORKERS))
+    urls = list(pending)[::-1]
+    pages = asyncio.Queue(maxsize=FETCH_WORKERS)
+    parsed = asyncio.Queue()
+    label_slots = asyncio.Semaphore(LABEL_WORKERS)
+    label_lookups = {}
+    totals = [0, 0]
+
+    def lookup_label(label, label_href):
+        # One in-flight lookup per label, shared by every chart that uses it
+        if label not in label_lookups:
+            async def run():
+                async with label_slots:
+                    return (await asyncio.to_thread(get_label_img, label, label_href))[1]
+            label_lookups[label] = asyncio.ensure_future(run())
+        return label_lookups[label]
+
+    async def fetcher():
+        while urls:
+            url = urls.pop()
+            try:
+                html = await asyncio.to_thread(fetch_html, url)
+            except Exception as e:
+                print(f"  ⚠️  Error fetching chart {url}: {e}")
+                chart_failed(url, e)
+                continue
+            await pages.put((url, html))
+
+    async def parser():
+        while True:
+            url, html = await pages.get()
+            try:
+                chart_date_created, chart_image, tracks_data = await asyncio.to_thread(parse_chart_page, html)
+                unique_labels, cached, missing = cached_label_images(tracks_data)
+                lookups = {l: lookup_label(l, h) for l, h in missing.items()}
+                await parsed.put((url, chart_date_created, chart_image, tracks_data, unique_labels, lookups))
+            except Exception as e:
+                print(f"  ⚠️  Error parsing chart {url}: {e}")
+                chart_failed(url, e)
+            finally:
+                pages.task_done()
+
+    async def writer():
+        while True:
+            url, chart_date_created, chart_image, tracks_data, unique_labels, lookups = await parsed.get()
+            try:
+                fetched = dict(zip(lookups, await asyncio.gather(*lookups.values())))
+                save_label_cache(fetched, unique_labels)
+                added, skipped = store_chart(url, pending[url], chart_date_created, chart_image, tracks_data)
+                totals[0] += added
+                totals[1] += skipped
+                print(f"📀 {pending[url]} - {len(tracks_data)} tracks, {len(lookups)} label lookups, added {added}")
+            except Exception as e:
+                print(f"  ⚠️  Error storing chart {url}: {e}")
+            finally:
+                parsed.task_done()
+
+    fetchers = [asyncio.create_task(fetcher()) for _ in range(max(1, min(FETCH_WORKERS, len(urls))))]
+    stages = [asyncio.create_task(parser()) for _ in range(PARSE_WORKERS)]
+    stages.append(asyncio.create_task(writer()))
+    await asyncio.gather(*fetchers)
+    await pages.join()
+    await parsed.join()
+    for task in stages: task.cancel()
+    return tuple(totals)
+
+def ingest_charts(input_links):
+    pending = {}
+    for url in input_links:
+        chart_id = chart_id_from_url(url)
+        chart_name = chart_name_from_url(url)
+        if store.chart_ingested(chart_id) or url in pending:
+            print(f"⏭️  Chart '{chart_name}' already exists in DB - skipping...")
+            continue
+        if chart_already_exists(chart_name) or chart_name in pending.values():
+            existing = store.chart_url(chart_name)
+            if existing is not None and chart_id_from_url(existing) in (None, chart_id):
+                print(f"⏭️  Chart '{chart_name}' already exists in DB - skipping...")
+                store.mark_chart_ingested(chart_id, url)
+                continue
+            # Same slug as a different chart (e.g. a reused title): keep both
+            chart_name = f"{chart_name} #{chart_id}"
+        pending[url] = chart_name
+
+    retry_failed_labels()
+    print(f"🌐 Fetching {len(pending)} chart(s) with {FETCH_WORKERS} workers ({PIPELINE} pipeline, {parser_backend()} parser)...")
+    if PIPELINE == "async":
+        total_added, total_skipped = asyncio.run(ingest_charts_async(pending))
+    else:
+        total_added, total_skipped = ingest_charts_threaded(pending)
+    print(f"✅ DB updated. Added: {total_added}, Skipped: {total_skipped}")
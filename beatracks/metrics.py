@@ -0,0 +1,27 @@
+import contextlib
+import threading
+import time
+
+# ============================
+# Run metrics: stage timings and counters for the run report
+# ============================
+# Stage seconds are summed over calls, so stages running on worker threads
+# can add up to more than the wall time of the run.
+run_timings = {}
+run_counters = {}
+metrics_lock = threading.Lock()
+
+def count(name, n=1):
+    with metrics_lock:
+        run_counters[name] = run_counters.get(name, 0) + n
+
+@contextlib.contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with metrics_lock:
+            calls, seconds = run_timings.get(stage, (0, 0.0))
+            run_timings[stage] = (calls + 1, seconds + elapsed)
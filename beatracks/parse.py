@@ -0,0 +1,283 @@
+import json
+import os
+import re
+from datetime import datetime
+
+from bs4 import BeautifulSoup
+import soupsieve as sv
+try:
+    import lxml.html as lxml_html
+    from lxml import etree
+except ImportError:
+    lxml_html = None
+
+from .metrics import count, timed
+
+# ============================
+# Parser settings
+# ============================
+# "auto" uses lxml when it is installed and falls back to BeautifulSoup's html.parser
+PARSER_BACKEND = os.getenv("PARSER_BACKEND", "auto").strip().lower()
+# "auto" reads tracks from the page's embedded JSON and falls back to the DOM; "dom" always scrapes the DOM
+CHART_EXTRACT = os.getenv("CHART_EXTRACT", "auto").strip().lower()
+
+# ============================
+# Date parsing function
+# ============================
+def parse_date_safe(text):
+    if not text: return None
+    for fmt in ("%Y-%m-%d", "%d.%m.%y", "%d/%m/%Y"):
+        try: return datetime.strptime(text, fmt)
+        except: continue
+    return None
+
+# ============================
+# HTML parsing backends: lxml when installed, BeautifulSoup otherwise
+# ============================
+# Row-extraction rules are compiled once at import: soupsieve selectors for
+# BeautifulSoup, XPath expressions for lxml. Both return the same track dicts.
+CHART_INFO_RE = re.compile(r"ChartDetailCard-style__Info")
+CHART_IMAGE_RE = re.compile(r"ChartDetailCard-style__ImageWrapper")
+LABEL_CELL_RE = re.compile(r"Table-style__TableCell.*label")
+TRACK_HREF_RE = re.compile(r"/track/[^/]+/(\d+)")
+
+BS4_RULES = {
+    "rows": sv.compile("div[class*=TableRow]"),
+    "title": sv.compile("div[class*=title] span"),
+    "artists": sv.compile("div[class*=ArtistNames] a"),
+    "genre": sv.compile("div[class*=bpm] div"),
+    "artwork": sv.compile("a.artwork img"),
+    "track_link": sv.compile("a[href*='/track/']"),
+    "date": sv.compile("div[class*=cell][class*=date]"),
+    "chart_links": sv.compile("a[href*='/chart/']"),
+}
+
+if lxml_html is not None:
+    XPATH_NS = {"re": "http://exslt.org/regular-expressions"}
+    LXML_RULES = {
+        "rows": etree.XPath("//div[contains(@class,'TableRow')]"),
+        "title": etree.XPath("(.//div[contains(@class,'title')]//span)[1]"),
+        "artists": etree.XPath(".//div[contains(@class,'ArtistNames')]//a"),
+        "genre": etree.XPath("(.//div[contains(@class,'bpm')]//div)[1]"),
+        "label": etree.XPath("(.//div[re:test(@class,'Table-style__TableCell.*label')])[1]//a[1]", namespaces=XPATH_NS),
+        "artwork": etree.XPath("(.//a[contains(concat(' ',normalize-space(@class),' '),' artwork ')]//img)[1]/@src"),
+        "track_link": etree.XPath("(.//a[contains(@href,'/track/')])[1]/@href"),
+        "date": etree.XPath("(.//div[contains(@class,'cell') and contains(@class,'date')])[1]"),
+        "chart_info": etree.XPath("//div[contains(@class,'ChartDetailCard-style__Info')]"),
+        "chart_image": etree.XPath("(//div[contains(@class,'ChartDetailCard-style__ImageWrapper')])[1]//img[1]/@src"),
+        "label_img": etree.XPath("//img[@alt=$alt]/@src"),
+        "chart_links": etree.XPath("//a[contains(@href,'/chart/')]/@href"),
+    }
+
+def parser_backend():
+    if PARSER_BACKEND in ("auto", "lxml") and lxml_html is not None:
+        return "lxml"
+    return "bs4"
+
+def track_id_from_href(href):
+    match = TRACK_HREF_RE.search(href or "")
+    return int(match.group(1)) if match else None
+
+def make_track(row_artist, row_title, genre, label, label_href, artwork, release_str, beatport_id=None):
+    return {
+        "artist": row_artist,
+        "title": row_title,
+        "genre": genre,
+        "label": label,
+        "label_href": label_href,
+        "artwork": artwork.replace("95x95", "500x500") if artwork else "",
+        "release_dt": parse_date_safe(release_str) if release_str else None,
+        "release_str": release_str if release_str is not None else "NONE",
+        "beatport_id": beatport_id,
+    }
+
+# ---- BeautifulSoup (html.parser) ----
+def get_chart_metadata(soup):
+    date_created = None
+    info_divs = soup.find_all("div", class_=CHART_INFO_RE)
+    for div in info_divs:
+        p_tag = div.find("p")
+        if p_tag and "Date Created" in p_tag.text:
+            span = div.find("span")
+            if span:
+                date_created = span.text.strip()
+                break
+    chart_image = ""
+    image_wrapper = soup.find("div", class_=CHART_IMAGE_RE)
+    if image_wrapper:
+        img = image_wrapper.find("img")
+        if img and img.get("src"):
+            chart_image = img["src"]
+    return date_created, chart_image
+
+def parse_track_row(row):
+    row_title = BS4_RULES["title"].select_one(row)
+    row_title = row_title.text.strip() if row_title else None
+
+    artist_tags = BS4_RULES["artists"].select(row)
+    row_artist = ", ".join(a.text.strip() for a in artist_tags) if artist_tags else None
+
+    if not row_title or not row_artist: return None
+
+    genre_div = BS4_RULES["genre"].select_one(row)
+    genre = genre_div.text.strip() if genre_div else "Unknown"
+
+    label_div = row.find("div", class_=LABEL_CELL_RE)
+    label_a = label_div.find("a") if label_div else None
+    label = label_a.text.strip() if label_a else "Unknown"
+    label_href = label_a["href"] if label != "Unknown" and label_a else None
+
+    artwork_img = BS4_RULES["artwork"].select_one(row)
+    date_div = BS4_RULES["date"].select_one(row)
+    track_a = BS4_RULES["track_link"].select_one(row)
+    return make_track(row_artist, row_title, genre, label, label_href,
+                      artwork_img["src"] if artwork_img else "",
+                      date_div.text.strip() if date_div else None,
+                      track_id_from_href(track_a.get("href") if track_a else None))
+
+def bs4_chart_page(html):
+    with timed("parse_document"):
+        soup = BeautifulSoup(html, "html.parser")
+    try:
+        with timed("parse_metadata"):
+            chart_date_created, chart_image = get_chart_metadata(soup)
+    except Exception as e:
+        count("parse_metadata_errors")
+        print(f"  ⚠️  Error reading chart metadata: {e}")
+        chart_date_created, chart_image = None, ""
+    with timed("parse_rows"):
+        tracks = [parse_track_row(row) for row in BS4_RULES["rows"].select(soup)]
+    return chart_date_created, chart_image, [t for t in tracks if t]
+
+# ---- lxml ----
+def lxml_text(nodes):
+    return nodes[0].text_content().strip() if nodes else None
+
+def lxml_chart_page(html):
+    with timed("parse_document"):
+        doc = lxml_html.fromstring(html)
+    with timed("parse_metadata"):
+        chart_date_created = None
+        for div in LXML_RULES["chart_info"](doc):
+            p_tag = div.find(".//p")
+            if p_tag is not None and "Date Created" in p_tag.text_content():
+                span = div.find(".//span")
+                if span is not None:
+                    chart_date_created = span.text_content().strip()
+                    break
+        chart_image = (LXML_RULES["chart_image"](doc) or [""])[0]
+
+    with timed("parse_rows"):
+        tracks = lxml_track_rows(doc)
+    return chart_date_created, chart_image, tracks
+
+def lxml_track_rows(doc):
+    tracks = []
+    for row in LXML_RULES["rows"](doc):
+        row_title = lxml_text(LXML_RULES["title"](row))
+        artist_tags = LXML_RULES["artists"](row)
+        row_artist = ", ".join(a.text_content().strip() for a in artist_tags) if artist_tags else None
+        if not row_title or not row_artist: continue
+
+        label_a = LXML_RULES["label"](row)
+        label = label_a[0].text_content().strip() if label_a else "Unknown"
+        label_href = label_a[0].get("href") if label != "Unknown" and label_a else None
+
+        tracks.append(make_track(row_artist, row_title, lxml_text(LXML_RULES["genre"](row)) or "Unknown",
+                                 label, label_href, (LXML_RULES["artwork"](row) or [""])[0],
+                                 lxml_text(LXML_RULES["date"](row)),
+                                 track_id_from_href((LXML_RULES["track_link"](row) or [None])[0])))
+    return tracks
+
+# ---- Embedded page JSON (Next.js __NEXT_DATA__) ----
+NEXT_DATA_MARKER = '<script id="__NEXT_DATA__" type="application/json">'
+
+def image_url(image, size="500x500"):
+    if not isinstance(image, dict): return ""
+    if image.get("dynamic_uri"):
+        return image["dynamic_uri"].replace("{w}x{h}", size)
+    return image.get("uri") or ""
+
+def find_json(node, match, depth=0):
+    # Depth-first search for the first dict/list the predicate accepts
+    if depth > 12: return None
+    if match(node): return node
+    children = node.values() if isinstance(node, dict) else node if isinstance(node, list) else []
+    for child in children:
+        found = find_json(child, match, depth + 1)
+        if found is not None: return found
+    return None
+
+def is_track_list(node):
+    return (isinstance(node, list) and node and isinstance(node[0], dict)
+            and "artists" in node[0] and "mix_name" in node[0])
+
+def is_chart_detail(node):
+    return isinstance(node, dict) and "track_count" in node and "name" in node
+
+def json_track(item):
+    names = [a["name"] for a in item.get("artists") or []]
+    names += [r["name"] for r in item.get("remixers") or [] if r["name"] not in names]
+    title = " ".join(p for p in (item.get("name"), item.get("mix_name")) if p)
+    if not title or not names: return None
+
+    genre = (item.get("genre") or {}).get("name") or "Unknown"
+    if item.get("sub_genre"):
+        # Same text the DOM path reads from the genre cell
+        genre = f"{genre} |  {item['sub_genre']['name']}"
+
+    release = item.get("release") or {}
+    label_data = release.get("label") or item.get("label") or {}
+    label = label_data.get("name") or "Unknown"
+    label_href = f"/label/{label_data['slug']}/{label_data['id']}" if label != "Unknown" and label_data.get("slug") else None
+
+    release_str = item.get("new_release_date") or item.get("publish_date")
+    track = make_track(", ".join(names), title, genre, label, label_href,
+                       image_url(release.get("image") or item.get("image")), release_str,
+                       item.get("id") if isinstance(item.get("id"), int) else None)
+    track["label_img"] = image_url(label_data.get("image"))
+    return track
+
+def parse_chart_json(html):
+    start = html.find(NEXT_DATA_MARKER)
+    if start < 0: return None
+    start += len(NEXT_DATA_MARKER)
+    end = html.find("</script>", start)
+    try:
+        data = json.loads(html[start:end])
+    except ValueError:
+        return None
+    items = find_json(data, is_track_list)
+    if items is None: return None
+    chart = find_json(data, is_chart_detail) or {}
+    chart_date_created = None
+    for key in ("publish_date", "add_date", "change_date"):
+        if chart.get(key):
+            chart_date_created = chart[key][:10]
+            break
+    tracks = [json_track(item) for item in items]
+    return chart_date_created, image_url(chart.get("image")), [t for t in tracks if t]
+
+# ---- Entry points ----
+def parse_chart_page(html, backend=None):
+    if CHART_EXTRACT != "dom":
+        with timed("parse_json"):
+            parsed = parse_chart_json(html)
+        if parsed is not None: return parsed
+    backend = backend or parser_backend()
+    return lxml_chart_page(html) if backend == "lxml" else bs4_chart_page(html)
+
+def parse_label_image(html, label, backend=None):
+    backend = backend or parser_backend()
+    if backend == "lxml":
+        src = (LXML_RULES["label_img"](lxml_html.fromstring(html), alt=label) or [""])[0]
+    else:
+        img_tag = BeautifulSoup(html, "html.parser").find("img", alt=label)
+        src = img_tag["src"] if img_tag else ""
+    return src.replace("87x87", "500x500")
+
+def parse_chart_links(html, backend=None):
+    backend = backend or parser_backend()
+    if backend == "lxml":
+        return LXML_RULES["chart_links"](lxml_html.fromstring(html))
+    return [a["href"] for a in BS4_RULES["chart_links"].select(BeautifulSoup(html, "html.parser"))]
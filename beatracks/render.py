@@ -0,0 +1,1013 @@
+import base64
+import contextlib
+import gzip
+import hashlib
+import json
+import os
+import re
+import unicodedata
+import zlib
+from datetime import datetime
+from html import escape
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from . import store
+from .store import get_charts, iter_chart_tracks
+from .metrics import count, timed
+
+# ============================
+# Output settings
+# ============================
+OUTPUT_FILE = "index.html"
+# "html": one page with every track in the DOM; "sharded": small shell page + per-chart JSON loaded on demand
+OUTPUT_MODE = os.getenv("OUTPUT_MODE", "html").strip().lower()
+DATA_DIR = os.path.join(os.path.dirname(OUTPUT_FILE), "data")
+# Local image mirror (filled by `python app.py images`), next to the page
+IMAGE_DIR = os.path.join(os.path.dirname(OUTPUT_FILE), "img")
+THUMB_SIZE = "95x95"
+LARGE_SIZE = "500x500"
+# Static CSS/JS, written under content-hashed names so browsers can cache them for good
+ASSETS_DIR = os.path.join(os.path.dirname(OUTPUT_FILE), "assets")
+# PRECOMPRESS=1 writes .gz (and .br, with the brotli package) next to every output file,
+# for hosts that serve precompressed files. GitHub Pages compresses on its own.
+PRECOMPRESS = os.getenv("PRECOMPRESS", "").strip().lower() not in ("", "0", "false", "no")
+
+# ============================
+# Tag colors (stable per name, so unchanged charts render identically)
+# ============================
+def tag_color(name):
+    digest = hashlib.md5(name.encode("utf-8")).digest()
+    return f"rgb({140 + digest[0] % 116},{140 + digest[1] % 116},{140 + digest[2] % 116})"
+
+def tag_class(name):
+    return "c" + hashlib.md5(name.encode("utf-8")).hexdigest()[:7]
+
+def colors_css(names):
+    return "".join(f".{tag_class(n)}{{background:{tag_color(n)}}}\n" for n in sorted(set(names)))
+
+# ============================
+# Image variants: local mirror copy when there is one, else the CDN's resized variant
+# ============================
+CDN_SIZE_RE = re.compile(r"/image_size/\d+x\d+/")
+
+# {remote url: (thumb src, large src)}, loaded by render_site
+image_mirror = {}
+
+def image_src(url, size=LARGE_SIZE):
+    if not url: return ""
+    if url in image_mirror:
+        thumb, large = image_mirror[url]
+        return thumb if size == THUMB_SIZE else large
+    return CDN_SIZE_RE.sub(f"/image_size/{size}/", url)
+
+# ============================
+# HTML fragments
+# ============================
+# Bump when the markup of a chart block changes, so cached fragments are rebuilt
+RENDER_VERSION = "3"
+
+def format_release(release_dt_str, release_str):
+    release_dt = datetime.fromisoformat(release_dt_str) if release_dt_str else None
+    release_str = release_str if release_str else "NONE"
+    release_data_attr = release_dt.strftime('%Y-%m-%d') if release_dt else ""
+    release_display = release_dt.strftime('%d-%m-%y') if release_dt else release_str
+    return release_data_attr, release_display
+
+def render_track(row):
+    artist, title, genre, label, label_img, artwork, release_dt_str, release_str, is_dup, all_charts_str = row
+    release_data_attr, release_display = format_release(release_dt_str, release_str)
+    dup_html = '<span class="duplicate">⚠️</span>' if is_dup else ''
+    # The chart name sits on the chart block; the chart list is only read by the duplicate tooltip
+    all_charts_attr = f' data-all-charts="{escape(all_charts_str)}"' if is_dup else ''
+    return f"""
+<div class="track"{all_charts_attr}
+ data-genre="{escape(genre)}"
+ data-label="{escape(label)}"
+ data-date="{release_data_attr}"
+ data-artwork="{escape(image_src(artwork))}"
+ data-label-artwork="{escape(image_src(label_img))}">
+ <div class="song-line">
+  <div class="track-left">
+    <span class="date-tag">{release_display}</span>
+    <span class="genre-tag {tag_class(genre)}">[{escape(genre)}]</span>
+    <span class="track-title">{escape(artist)} – {escape(title)}</span>
+    <span class="label-tag {tag_class(label)}">[{escape(label)}]</span>
+    {dup_html}
+  </div>
+ </div>
+ <div class="artwork-box"></div>
+</div>
+"""
+
+def format_chart_date(chart_date):
+    if not chart_date: return ""
+    try:
+        return datetime.strptime(chart_date, "%Y-%m-%d").strftime("[%d|%m|%y]")
+    except:
+        return f"({chart_date})"
+
+def render_chart_block(chart, rows):
+    chart_name = chart["name"]
+    chart_image = chart["image"]
+    chart_date_formatted = format_chart_date(chart["date"])
+
+    img_html = ''
+    if chart_image:
+        # Shown at 40px: the thumbnail covers 2x screens, the large variant is for the hover preview
+        thumb, large = escape(image_src(chart_image, THUMB_SIZE)), escape(image_src(chart_image))
+        img_html = (f'<img src="{thumb}" srcset="{thumb} 95w, {large} 500w" sizes="40px" data-full="{large}"'
+                    f' alt="{escape(chart_name)}" width="40" height="40" loading="lazy" decoding="async">')
+    date_html = f'<span class="chart-date">{chart_date_formatted}</span>' if chart_date_formatted else ''
+
+    html = [f'<div class="chart-block" data-chart="{escape(chart_name)}">']
+    html.append(f'<div class="chart-header">{img_html}<div class="chart-header-text">📀 {escape(chart_name)} {date_html}</div></div>')
+    html.append('<div class="chart-content">')
+    for row in rows:
+        html.append(render_track(row))
+    html.append('</div></div>')
+    return minify_html("".join(html))
+
+# ============================
+# Client-side search index: prefix-searchable tokens + genre/label/date facets,
+# plus whole-history results from the query server when the page is served by it
+# ============================
+SEARCH_SCRIPT = r"""
+let searchIndex=null;
+const facetCache={};
+
+function queryWords(text){
+  return text.normalize('NFKD').replace(/[\u0300-\u036f]/g,'').toLowerCase().split(/[^\p{L}\p{N}]+/u).filter(Boolean);
+}
+
+function loadSearchIndex(url,expected){
+  fetch(url).then(r=>r.json()).then(idx=>{
+    if(idx.n!==expected) return;
+    searchIndex=idx;
+    applyFilters();
+  }).catch(()=>{});
+}
+
+function decodeIds(enc,out){
+  if(typeof enc==='string'){
+    const bytes=atob(enc);
+    for(let i=0;i<out.length;i++) if(bytes.charCodeAt(i>>3)&(1<<(i&7))) out[i]=1;
+  } else {
+    let id=0;
+    for(const d of enc){ id+=d; out[id]=1; }
+  }
+  return out;
+}
+
+function lowerBound(tokens,word){
+  let lo=0, hi=tokens.length;
+  while(lo<hi){ const mid=(lo+hi)>>1; if(tokens[mid]<word) lo=mid+1; else hi=mid; }
+  return lo;
+}
+
+function matchTerm(term){
+  const words=queryWords(term);
+  if(!words.length) return null;
+  const {tokens,postings,n}=searchIndex;
+  let result=null;
+  for(const w of words){
+    const m=new Uint8Array(n);
+    for(let k=lowerBound(tokens,w); k<tokens.length && tokens[k].startsWith(w); k++) decodeIds(postings[k],m);
+    if(result){ for(let i=0;i<n;i++) result[i]&=m[i]; } else result=m;
+  }
+  return result;
+}
+
+function facet(kind,value){
+  if(!value) return null;
+  const key=kind+'|'+value;
+  if(!facetCache[key]) facetCache[key]=decodeIds(searchIndex.facets[kind][value]||[],new Uint8Array(searchIndex.n));
+  return facetCache[key];
+}
+
+function visibleSet(term){
+  const sets=[matchTerm(term),facet('genre',activeGenre),facet('label',activeLabel),facet('date',activeDate)].filter(Boolean);
+  const n=searchIndex.n;
+  const out=new Uint8Array(n);
+  if(!sets.length){ out.fill(1); return out; }
+  out.set(sets[0]);
+  for(const s of sets.slice(1)) for(let i=0;i<n;i++) out[i]&=s[i];
+  return out;
+}
+
+function esc(s){
+  return String(s==null?'':s).replace(/[&<>"']/g,c=>({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;',"'":'&#x27;'}[c]));
+}
+
+// Served by `beatracks serve` (which adds the beatracks-api meta tag): the search box also
+// queries the whole DB through /api/search. Static hosting and file:// never send a request.
+const searchApi=!!document.querySelector('meta[name="beatracks-api"]');
+let apiTimer=null, apiSeq=0;
+
+function showApiResults(html){
+  let panel=document.getElementById('api-results');
+  if(!panel){
+    panel=document.createElement('div');
+    panel.id='api-results';
+    document.getElementById('search-bar').appendChild(panel);
+  }
+  panel.innerHTML=html;
+}
+
+document.getElementById('search-input').addEventListener('input',e=>{
+  if(!searchApi) return;
+  clearTimeout(apiTimer);
+  const term=e.target.value.trim();
+  const seq=++apiSeq;
+  if(!term){ showApiResults(''); return; }
+  apiTimer=setTimeout(()=>{
+    fetch('api/search?per_page=20&q='+encodeURIComponent(term)).then(r=>r.json()).then(d=>{
+      if(seq!==apiSeq || d.error) return;
+      showApiResults(`<div class="api-total">${d.total} in the whole history (${d.ms} ms)</div>`+d.results.map(t=>
+        `<div class="api-track"><span class="api-date">${esc(t.release)}</span> ${esc(t.artist)} - ${esc(t.title)} `+
+        `<span class="api-meta">[${esc(t.genre)}] [${esc(t.label)}] ${esc(t.charts.join(' | '))}</span></div>`).join(''));
+    }).catch(()=>{});
+  },150);
+});
+"""
+
+def search_tokens(*texts):
+    text = unicodedata.normalize("NFKD", " ".join(texts))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return sorted(set(w for w in re.split(r"[\W_]+", text) if w))
+
+def index_docs(rows):
+    docs = []
+    for artist, title, genre, label, label_img, artwork, release_dt_str, release_str, is_dup, all_charts_str in rows:
+        docs.append([search_tokens(artist, title, label), genre, label, format_release(release_dt_str, release_str)[0]])
+    return docs
+
+def encode_ids(ids, n):
+    # Delta-encoded id list, or a base64 bitmap when that is smaller
+    if len(ids) * 3 > n // 8:
+        bitmap = bytearray((n + 7) // 8)
+        for i in ids: bitmap[i >> 3] |= 1 << (i & 7)
+        return base64.b64encode(bytes(bitmap)).decode("ascii")
+    return [b - a for a, b in zip([0] + ids, ids)]
+
+def build_search_index(docs):
+    # docs can be a generator; only the posting lists are kept
+    postings = {}
+    facets = {"genre": {}, "label": {}, "date": {}}
+    n = 0
+    for tokens, genre, label, date in docs:
+        for tok in tokens: postings.setdefault(tok, []).append(n)
+        facets["genre"].setdefault(genre, []).append(n)
+        facets["label"].setdefault(label, []).append(n)
+        if date: facets["date"].setdefault(date, []).append(n)
+        n += 1
+    tokens = sorted(postings)
+    return {
+        "n": n,
+        "tokens": tokens,
+        "postings": [encode_ids(postings[t], n) for t in tokens],
+        "facets": {kind: {v: encode_ids(ids, n) for v, ids in values.items()} for kind, values in facets.items()},
+    }
+
+def chart_docs(keys):
+    for blob in cached_blobs(keys):
+        yield from json.loads(blob)
+
+def write_search_index(cache, charts, path):
+    stale = [chart["id"] for chart in charts if f"index:{chart['id']}" not in cache]
+    with store.conn:
+        for chart_id, rows in iter_chart_tracks(stale):
+            store.conn.execute("INSERT OR REPLACE INTO render_cache VALUES (?,?,?)",
+                               (f"index:{chart_id}", None, zlib.compress(json.dumps(index_docs(rows)).encode("utf-8"))))
+            cache[f"index:{chart_id}"] = None
+    index = build_search_index(chart_docs([f"index:{chart['id']}" for chart in charts]))
+    return write_if_changed(path, json.dumps(index, ensure_ascii=False, separators=(",", ":")))
+
+PAGE_CSS = """body {margin:0;background:#000;color:#ccc;font-family:Consolas;}
+#layout {display:flex;}
+#genre-sidebar { width:180px; background:#050505; border-right:1px solid #222; padding:10px; box-sizing:border-box; }
+#genre-sidebar h3 {margin-top:0;color:#ffd;font-size:14px;}
+.genre-filter { display:block; margin-bottom:6px; padding:4px 6px; border-radius:6px; cursor:pointer; font-weight:bold; color:#000; }
+.genre-filter.active {outline:2px solid #fff;}
+#content {padding:10px; flex:1;}
+#expand-collapse-btn { margin-bottom:10px; padding:6px 12px; background:#222; color:#ff0; border:none; cursor:pointer; font-weight:bold; }
+.track {padding:4px;}
+.track:hover {background:#111;}
+.hidden {display:none;}
+.duplicate {background:yellow;color:#000; padding:0 3px; border-radius:3px; margin-left:5px; cursor:pointer;}
+.song-line {display:flex; width:100%; align-items:center;}
+.track-left {display:flex; align-items:center; gap:5px; width:100%; overflow:hidden;}
+.date-tag {padding:2px 6px; border-radius:5px; background:#666; font-weight:bold; color:#d0d0d0; cursor:pointer; flex-shrink:0;}
+.genre-tag {padding:2px 6px; border-radius:5px; color:#000; font-weight:bold; cursor:pointer; flex-shrink:0;}
+.label-tag {padding:2px 6px; border-radius:5px; color:#000; font-weight:bold; flex-shrink:0; cursor:pointer;}
+.label-tag:hover {outline:2px solid #fff;}
+.track-title {cursor:pointer; color:#ccc; white-space:nowrap; overflow:hidden; text-overflow:ellipsis; max-width:calc(100vw - 520px); min-width:0;}
+.artwork-box {max-height:0; overflow:hidden; transition:max-height .3s ease; margin-left:0; display:flex; gap:10px;}
+.track.expanded .artwork-box {max-height:420px;}
+.artwork-box img {width:400px;height:400px; object-fit:cover;}
+.artwork-box img.label-img {width:400px;height:400px; object-fit:cover;}
+.hover-preview {position:fixed; z-index:10000; pointer-events:none; border:3px solid #ff0; box-shadow:0 0 20px rgba(255,255,0,0.5);}
+.hover-preview img {display:block; max-width:none; max-height:none;}
+#search-bar input {width:50%; padding:6px; font-size:16px; background:#000; color:#fff; border:1px solid #555;}
+#api-results {max-height:40vh; overflow-y:auto; margin:4px 0 8px;}
+#api-results:empty {display:none;}
+.api-total {color:#ff0; font-weight:bold; padding:2px 0;}
+.api-track {padding:2px 0; white-space:nowrap; overflow:hidden; text-overflow:ellipsis;}
+.api-date {padding:0 6px; border-radius:5px; background:#666; color:#d0d0d0; font-weight:bold;}
+.api-meta {color:#888;}
+.chart-header { background:#111; color:#ff0; font-weight:bold; padding:6px; cursor:pointer; margin-bottom:2px; border-radius:4px; display:flex; align-items:center; gap:8px; }
+.chart-header img { width:40px; height:40px; border-radius:4px; object-fit:cover; }
+.chart-header-text { flex:1; }
+.chart-date { color:#999; font-size:12px; font-weight:normal; margin-left:10px; }
+.chart-content { max-height:0; overflow:hidden; transition:max-height .3s ease; }
+.chart-block.expanded .chart-content { max-height:5000px; }
+.dup-tooltip {position:fixed; background:#ff0; color:#000; padding:2px 6px; border-radius:4px; font-weight:bold; pointer-events:none; z-index:9999;}
+"""
+
+def stylesheet_links(hrefs):
+    return "".join(f'<link rel="stylesheet" href="{href}">' for href in hrefs)
+
+def render_page_head(track_count, genres, stylesheets):
+    html = [f"""
+<!DOCTYPE html>
+<html lang="en">
+<meta charset="UTF-8">
+<title>Beatport Tracks</title>
+{stylesheet_links(stylesheets)}<body>
+
+<div id="search-bar">
+  <input type="text" id="search-input" placeholder="Search artist, track or label...">
+</div>
+
+<button id="expand-collapse-btn">Expand All / Collapse All</button>
+<div id="track-count">Tracks: {track_count}</div>
+
+<div id="layout">
+  <div id="genre-sidebar">
+    <h3>Genres</h3>
+"""]
+    for g in genres:
+        html.append(f'<span class="genre-filter {tag_class(g)}" data-genre="{escape(g)}">[{escape(g)}]</span>')
+    html.append("</div>")
+    html.append("<div id='content'>")
+    return minify_html("".join(html))
+
+PAGE_JS = SEARCH_SCRIPT+"""
+let activeGenre=null;
+let activeLabel=null;
+let activeDate=null;
+
+function updateTrackCount(){
+  const visible=document.querySelectorAll('.track:not(.hidden)').length;
+  document.getElementById('track-count').textContent="Tracks: "+visible;
+}
+
+function applyFilters(){
+  if(searchIndex){ showVisible(); return; }
+  document.querySelectorAll('.track').forEach(t=>{
+    let hide=false;
+    if(activeGenre && t.dataset.genre!==activeGenre) hide=true;
+    if(activeLabel && t.dataset.label!==activeLabel) hide=true;
+    if(activeDate && t.dataset.date!==activeDate) hide=true;
+    t.classList.toggle('hidden',hide);
+  });
+  updateTrackCount();
+}
+
+// With the search index loaded, only rows whose visibility changes are touched
+const trackEls=document.querySelectorAll('.track');
+let shown=null;
+function showVisible(){
+  const next=visibleSet(searchInput.value);
+  let count=0;
+  for(let i=0;i<next.length;i++){
+    if(next[i]) count++;
+    if(!shown || shown[i]!==next[i]) trackEls[i].classList.toggle('hidden',!next[i]);
+  }
+  shown=next;
+  document.getElementById('track-count').textContent="Tracks: "+count;
+}
+loadSearchIndex('search-index.json',trackEls.length);
+
+document.querySelectorAll('.genre-filter').forEach(tag=>{
+  tag.addEventListener('click', ()=>{
+    const g = tag.dataset.genre;
+    document.querySelectorAll('.genre-filter').forEach(t=>t.classList.remove('active'));
+    if(activeGenre===g){ activeGenre=null; } else { activeGenre=g; tag.classList.add('active'); }
+    applyFilters();
+  });
+});
+
+document.querySelectorAll('.genre-tag').forEach(tag=>{
+  tag.addEventListener('click',e=>{
+    e.stopPropagation();
+    const g = tag.textContent.replace(/[\[\]]/g,'');
+    activeGenre = (activeGenre===g)?null:g;
+    applyFilters();
+  });
+});
+
+document.querySelectorAll('.label-tag').forEach(tag=>{
+  tag.addEventListener('click',e=>{
+    e.stopPropagation();
+    const l = tag.textContent.replace(/[\[\]]/g,'');
+    document.querySelectorAll('.label-tag').forEach(t=>t.classList.remove('active-label'));
+    if(activeLabel===l){ activeLabel=null; }
+    else { activeLabel=l; tag.classList.add('active-label'); }
+    applyFilters();
+  });
+});
+
+document.querySelectorAll('.date-tag').forEach(tag=>{
+  tag.addEventListener('click',e=>{
+    e.stopPropagation();
+    const parent=tag.closest('.track');
+    const dateStr=parent.dataset.date;
+    activeDate = (activeDate===dateStr)?null:dateStr;
+    applyFilters();
+  });
+});
+
+document.querySelectorAll('.track-title').forEach(title=>{
+  title.addEventListener('click',()=>{
+    const track = title.closest('.track');
+    const box = track.querySelector('.artwork-box');
+    document.querySelectorAll('.track.expanded').forEach(t=>{
+        if(t !== track){ t.classList.remove('expanded'); t.querySelector('.artwork-box').innerHTML=''; }
+    });
+    if(track.classList.contains('expanded')){ track.classList.remove('expanded'); box.innerHTML=''; return; }
+    const artHTML = track.dataset.artwork ? `<img src="${track.dataset.artwork}" width="400" height="400" decoding="async">` : '';
+    const labelHTML = track.dataset.labelArtwork ? `<img class="label-img" src="${track.dataset.labelArtwork}" width="400" height="400" decoding="async">` : '';
+    if(artHTML || labelHTML) box.innerHTML = artHTML + labelHTML;
+    track.classList.add('expanded');
+  });
+});
+
+const searchInput = document.getElementById('search-input');
+searchInput.addEventListener('input', ()=>{
+    if(searchIndex){ showVisible(); return; }
+    const term = searchInput.value.toLowerCase();
+    document.querySelectorAll('.track').forEach(t=>{
+        let hide=false;
+        const text = (t.querySelector('.track-title').textContent+" "+t.dataset.label).toLowerCase();
+        if(term && !text.includes(term)) hide=true;
+        if(activeGenre && t.dataset.genre!==activeGenre) hide=true;
+        if(activeLabel && t.dataset.label!==activeLabel) hide=true;
+        if(activeDate && t.dataset.date!==activeDate) hide=true;
+        t.classList.toggle('hidden',hide);
+    });
+    updateTrackCount();
+});
+
+document.querySelectorAll('.chart-header').forEach(h=>{
+    h.addEventListener('click', ()=>{ h.parentElement.classList.toggle('expanded'); });
+});
+
+document.getElementById('expand-collapse-btn').addEventListener('click', ()=>{
+    document.querySelectorAll('.chart-block').forEach(c=>{ c.classList.toggle('expanded'); });
+});
+
+document.querySelectorAll('.duplicate').forEach(icon=>{
+    let tooltip;
+    icon.addEventListener('mouseenter', e=>{
+        const track = icon.closest('.track');
+        const allCharts = track.dataset.allCharts.split('|');
+        const currentChart = track.closest('.chart-block').dataset.chart;
+        const otherCharts = allCharts.filter(c => c !== currentChart);
+        if(otherCharts.length===0) return;
+        tooltip = document.createElement('div');
+        tooltip.className = 'dup-tooltip';
+        tooltip.textContent = otherCharts.join(', ');
+        document.body.appendChild(tooltip);
+        tooltip.style.left = e.clientX + 10 + 'px';
+        tooltip.style.top = e.clientY + 10 + 'px';
+    });
+    icon.addEventListener('mousemove', e=>{
+        if(tooltip){ tooltip.style.left = e.clientX + 10 + 'px'; tooltip.style.top = e.clientY + 10 + 'px'; }
+    });
+    icon.addEventListener('mouseleave', ()=>{ if(tooltip) tooltip.remove(); });
+});
+
+document.querySelectorAll('.chart-header img').forEach(img=>{
+    let preview;
+    img.addEventListener('mouseenter', e=>{
+        if(!img.src) return;
+        preview = document.createElement('div');
+        preview.className = 'hover-preview';
+        const previewImg = document.createElement('img');
+        previewImg.src = img.dataset.full || img.src;
+        preview.appendChild(previewImg);
+        document.body.appendChild(preview);
+        preview.style.left = e.clientX + 20 + 'px';
+        preview.style.top = e.clientY + 20 + 'px';
+    });
+    img.addEventListener('mousemove', e=>{
+        if(preview){ preview.style.left = e.clientX + 20 + 'px'; preview.style.top = e.clientY + 20 + 'px'; }
+    });
+    img.addEventListener('mouseleave', ()=>{ if(preview) preview.remove(); });
+});
+"""
+
+# ============================
+# Incremental render: only charts without a cached fragment are rebuilt
+# ============================
+def content_hash(*parts):
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+def load_render_cache():
+    c = store.conn.cursor()
+    # A new RENDER_VERSION drops every cached fragment
+    c.execute("SELECT content_hash FROM render_cache WHERE key='version'")
+    row = c.fetchone()
+    if row is None or row[0] != RENDER_VERSION:
+        with store.conn:
+            store.conn.execute("DELETE FROM render_cache")
+            store.conn.execute("INSERT INTO render_cache VALUES ('version',?,NULL)", (RENDER_VERSION,))
+    # Only the hashes are loaded; fragments are read back one at a time by cached_blobs
+    c.execute("SELECT key, content_hash FROM render_cache")
+    return dict(c.fetchall())
+
+def cached_blobs(keys):
+    c = store.conn.cursor()
+    for key in keys:
+        c.execute("SELECT html FROM render_cache WHERE key=?", (key,))
+        yield zlib.decompress(c.fetchone()[0])
+
+def write_compressed(path, data):
+    # mtime=0 keeps the .gz bytes stable for unchanged input
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(data, 9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(data))
+
+def remove_stale_copies(path):
+    # Copies left by a run with PRECOMPRESS (or brotli) on would be served instead of the new file
+    stale = [] if PRECOMPRESS else [".gz"]
+    if not PRECOMPRESS or brotli is None: stale.append(".br")
+    for ext in stale:
+        if os.path.exists(path + ext): os.remove(path + ext)
+
+def ensure_compressed(path):
+    # Turning PRECOMPRESS on later also covers files that have not changed since; turning it off drops the copies
+    remove_stale_copies(path)
+    if PRECOMPRESS and os.path.exists(path) and not os.path.exists(path + ".gz"):
+        with open(path, "rb") as f:
+            write_compressed(path, f.read())
+
+def write_chunks(path, chunks):
+    # Each chunk goes straight to the file (and its .gz/.br copies), so a page is never joined in memory.
+    # The file is replaced once complete.
+    size = 0
+    with timed("write"), contextlib.ExitStack() as stack:
+        f = stack.enter_context(open(path + ".tmp", "wb"))
+        gz = br = br_file = None
+        if PRECOMPRESS:
+            # mtime=0 keeps the .gz bytes stable for unchanged input
+            gz = stack.enter_context(gzip.GzipFile("", "wb", 9, stack.enter_context(open(path + ".gz", "wb")), mtime=0))
+            if brotli is not None:
+                br_file = stack.enter_context(open(path + ".br", "wb"))
+                br = brotli.Compressor()
+        for chunk in chunks:
+            data = chunk.encode("utf-8")
+            f.write(data)
+            if gz: gz.write(data)
+            if br: br_file.write(br.process(data))
+            size += len(data)
+        if br: br_file.write(br.finish())
+    os.replace(path + ".tmp", path)
+    remove_stale_copies(path)
+    count("files_written")
+    count("bytes_written", size)
+
+def write_file(path, text):
+    write_chunks(path, [text])
+
+def write_if_changed(path, text):
+    data = text.encode("utf-8")
+    # Size first: the file being replaced can be a full single-page index.html
+    if os.path.exists(path) and os.path.getsize(path) == len(data):
+        with open(path, "rb") as f:
+            if f.read() == data:
+                ensure_compressed(path)
+                return False
+    write_file(path, text)
+    return True
+
+# ============================
+# Build output: minified HTML, hashed CSS/JS assets
+# ============================
+def minify_html(html):
+    # Only template line breaks and indentation go; text and attribute values are untouched
+    html = re.sub(r">\s*\n\s*<", "><", html)
+    return re.sub(r"\s*\n\s*", " ", html).strip()
+
+def write_asset(name, ext, text):
+    filename = f"{name}.{content_hash(text)[:10]}.{ext}"
+    os.makedirs(ASSETS_DIR, exist_ok=True)
+    write_if_changed(os.path.join(ASSETS_DIR, filename), text)
+    return f"{os.path.basename(ASSETS_DIR)}/{filename}"
+
+def prune_assets(keep):
+    # Older hashed assets (and their .gz/.br copies) are no longer referenced
+    keep = {os.path.basename(href) for href in keep}
+    for filename in os.listdir(ASSETS_DIR):
+        if filename.removesuffix(".gz").removesuffix(".br") not in keep:
+            os.remove(os.path.join(ASSETS_DIR, filename))
+
+def tag_names():
+    return [name for (name,) in store.conn.execute("""
+        SELECT DISTINCT t.genre FROM chart_tracks ct JOIN tracks t ON t.id=ct.track_id
+        UNION SELECT DISTINCT l.name FROM chart_tracks ct JOIN tracks t ON t.id=ct.track_id JOIN labels l ON l.id=t.label_id
+    """)]
+
+def render_chart_fragments(cache, charts):
+    # Stale charts are rendered straight from the DB cursor into render_cache
+    stale = {chart["id"]: chart for chart in charts if f"chart:{chart['id']}" not in cache}
+    with store.conn:
+        for chart_id, rows in iter_chart_tracks(list(stale)):
+            with timed("render_charts"):
+                block = render_chart_block(stale[chart_id], rows)
+            # Hash the markup, so mirrored image paths count as a change too
+            h = content_hash(RENDER_VERSION, block)
+            store.conn.execute("INSERT OR REPLACE INTO render_cache VALUES (?,?,?)",
+                               (f"chart:{chart_id}", h, zlib.compress(block.encode("utf-8"))))
+            cache[f"chart:{chart_id}"] = h
+    return len(stale)
+
+def page_chunks(head, keys, script):
+    yield head
+    for block in cached_blobs(keys):
+        yield block.decode("utf-8")
+    yield "</div></div>"
+    yield f'<script src="{script}"></script></body></html>'
+
+def render_html_site(cache, charts, track_count, genres):
+    rerendered = render_chart_fragments(cache, charts)
+    keys = [f"chart:{chart['id']}" for chart in charts]
+
+    stylesheets = [write_asset("site", "css", PAGE_CSS), write_asset("colors", "css", colors_css(tag_names()))]
+    script = write_asset("page", "js", PAGE_JS)
+    prune_assets(stylesheets + [script])
+
+    page_key = f"page:{OUTPUT_FILE}"
+    page_hash = content_hash(RENDER_VERSION, stylesheets, script, track_count, genres, [cache[key] for key in keys])
+    index_path = os.path.join(os.path.dirname(OUTPUT_FILE), "search-index.json")
+    if os.path.exists(OUTPUT_FILE) and os.path.exists(index_path) and cache.get(page_key) == page_hash:
+        ensure_compressed(OUTPUT_FILE)
+        ensure_compressed(index_path)
+        print(f"✅ No chart changed - {OUTPUT_FILE} left as is")
+        return
+
+    write_search_index(cache, charts, index_path)
+    write_chunks(OUTPUT_FILE, page_chunks(render_page_head(track_count, genres, stylesheets), keys, script))
+    with store.conn:
+        store.conn.execute("INSERT OR REPLACE INTO render_cache VALUES (?,?,NULL)", (page_key, page_hash))
+
+    print(f"✅ HTML file saved to {OUTPUT_FILE} ({rerendered}/{len(charts)} charts re-rendered)")
+
+# ============================
+# Sharded output: shell page + data/manifest.json + data/charts/<id>.json
+# ============================
+def chart_shard(rows):
+    colors = {}
+    tracks = []
+    for artist, title, genre, label, label_img, artwork, release_dt_str, release_str, is_dup, all_charts_str in rows:
+        release_data_attr, release_display = format_release(release_dt_str, release_str)
+        colors[genre] = tag_color(genre)
+        colors[label] = tag_color(label)
+        tracks.append([artist, title, genre, label, image_src(label_img), image_src(artwork),
+                       release_data_attr, release_display, is_dup, all_charts_str])
+    return {"colors": colors, "tracks": tracks}
+
+def render_sharded_site(cache, charts, track_count, genres):
+    os.makedirs(os.path.join(DATA_DIR, "charts"), exist_ok=True)
+    chart_genres = {chart_id: json.loads(g) for chart_id, g in store.conn.execute("""
+        SELECT ct.chart_id, json_group_array(DISTINCT t.genre)
+        FROM chart_tracks ct JOIN tracks t ON t.id=ct.track_id GROUP BY ct.chart_id
+    """)}
+
+    entries = []
+    rewritten = 0
+    offset = 0
+    chart_counts = dict(store.conn.execute("SELECT chart_id, COUNT(*) FROM chart_tracks GROUP BY chart_id"))
+    stale = [chart["id"] for chart in charts
+             if f"shard:{chart['id']}" not in cache or not os.path.exists(os.path.join(DATA_DIR, f"charts/{chart['id']}.json"))]
+    with store.conn:
+        for chart_id, rows in iter_chart_tracks(stale):
+            with timed("render_charts"):
+                shard = json.dumps(chart_shard(rows), ensure_ascii=False, separators=(",", ":"))
+            h = content_hash(RENDER_VERSION, shard)
+            write_if_changed(os.path.join(DATA_DIR, f"charts/{chart_id}.json"), shard)
+            store.conn.execute("INSERT OR REPLACE INTO render_cache VALUES (?,?,NULL)", (f"shard:{chart_id}", h))
+            cache[f"shard:{chart_id}"] = h
+            rewritten += 1
+    for chart in charts:
+        shard_file = f"charts/{chart['id']}.json"
+        h = cache[f"shard:{chart['id']}"]
+        entries.append({
+            "id": chart["id"],
+            "name": chart["name"],
+            "date": format_chart_date(chart["date"]),
+            "image": image_src(chart["image"]),
+            "thumb": image_src(chart["image"], THUMB_SIZE),
+            "genres": chart_genres.get(chart["id"], []),
+            "offset": offset,
+            "count": chart_counts.get(chart["id"], 0),
+            "shard": f"{shard_file}?v={h[:10]}",
+        })
+        offset += chart_counts.get(chart["id"], 0)
+
+    manifest = {
+        "track_count": track_count,
+        "genres": [[g, tag_color(g)] for g in genres],
+        "charts": entries,
+    }
+    index_path = os.path.join(DATA_DIR, "search-index.json")
+    changed = False
+    if rewritten or not os.path.exists(index_path):
+        changed = write_search_index(cache, charts, index_path)
+    changed |= write_if_changed(os.path.join(DATA_DIR, "manifest.json"),
+                               json.dumps(manifest, ensure_ascii=False, separators=(",", ":")))
+    stylesheets = [write_asset("site", "css", PAGE_CSS + SHELL_CSS)]
+    script = write_asset("shell", "js", SHELL_JS)
+    prune_assets(stylesheets + [script])
+    if write_if_changed(OUTPUT_FILE, render_shell_page(stylesheets, script)):
+        changed = True
+        # The shell replaced the single-page output; an html render must write it again
+        with store.conn:
+            store.conn.execute("DELETE FROM render_cache WHERE key=?", (f"page:{OUTPUT_FILE}",))
+    if not changed and not rewritten:
+        print(f"✅ No chart changed - {OUTPUT_FILE} and {DATA_DIR}/ left as is")
+        return
+    print(f"✅ Shell page saved to {OUTPUT_FILE}, data in {DATA_DIR}/ ({rewritten}/{len(charts)} chart shards rewritten)")
+
+def render_shell_page(stylesheets, script):
+    return minify_html(f"""
+<!DOCTYPE html>
+<html lang="en">
+<meta charset="UTF-8">
+<title>Beatport Tracks</title>
+{stylesheet_links(stylesheets)}<body>
+
+<div id="search-bar">
+  <input type="text" id="search-input" placeholder="Search artist, track or label...">
+</div>
+
+<button id="expand-collapse-btn">Expand All / Collapse All</button>
+<div id="track-count">Tracks: …</div>
+
+<div id="layout">
+  <div id="genre-sidebar">
+    <h3>Genres</h3>
+  </div>
+  <div id='content'><div id="vlist"><div id="vwindow"></div></div></div>
+</div>
+<script src="{script}"></script></body></html>""")
+
+# Row heights are fixed so the virtual list can place rows without measuring them
+SHELL_CSS = """#vlist {position:relative;}
+#vwindow {position:absolute; left:0; right:0; top:0;}
+#vwindow .chart-header {height:52px; box-sizing:border-box; overflow:hidden;}
+#vwindow .track {height:28px; box-sizing:border-box; overflow:hidden;}
+#vwindow .track.expanded {height:448px;}
+#vwindow .track.loading {color:#555;}
+"""
+
+SHELL_JS = SEARCH_SCRIPT+r"""
+const DATA_DIR='data/';
+const HEADER_H=54, ROW_H=28, EXPANDED_H=448, OVERSCAN=10;
+let manifest=null;
+const shards={};
+const data={};
+const expanded=new Set();
+let expandedTrack=-1;
+let activeGenre=null;
+let activeLabel=null;
+let activeDate=null;
+let searchTerm='';
+let shown=null;
+let items=[];      // [chart index, global track id or -1 for the header]
+let offsets=[0];   // offsets[k] = top of items[k]; offsets[items.length] = total height
+let lastRange='';
+
+function loadShard(ci){
+  const chart=manifest.charts[ci];
+  if(!shards[ci]) shards[ci]=fetch(DATA_DIR+chart.shard).then(r=>r.json()).then(d=>{ data[ci]=d; refresh(); return d; });
+  return shards[ci];
+}
+
+function loadAll(){ return Promise.all(manifest.charts.map((c,ci)=>loadShard(ci))); }
+
+function filtering(){ return activeGenre||activeLabel||activeDate||searchTerm; }
+
+function trackRow(ci,id){ const d=data[ci]; return d?d.tracks[id-manifest.charts[ci].offset]:null; }
+
+// Without the search index, filters can only be applied to loaded shards
+function rowVisible(ci,id){
+  if(searchIndex) return !shown || shown[id];
+  if(!filtering()) return true;
+  const t=trackRow(ci,id);
+  if(!t) return false;
+  const [artist,title,genre,label,,,date]=t;
+  if(searchTerm && !(artist+" "+title+" "+label).toLowerCase().includes(searchTerm)) return false;
+  if(activeGenre && genre!==activeGenre) return false;
+  if(activeLabel && label!==activeLabel) return false;
+  if(activeDate && date!==activeDate) return false;
+  return true;
+}
+
+function buildItems(){
+  shown=searchIndex && filtering()?visibleSet(searchTerm):null;
+  items=[];
+  let count=0;
+  manifest.charts.forEach((chart,ci)=>{
+    const rows=[];
+    for(let id=chart.offset;id<chart.offset+chart.count;id++) if(rowVisible(ci,id)) rows.push(id);
+    count+=rows.length;
+    if(filtering() && !rows.length) return;
+    if(!searchIndex && activeGenre && !chart.genres.includes(activeGenre)) return;
+    items.push([ci,-1]);
+    if(expanded.has(ci)) rows.forEach(id=>items.push([ci,id]));
+  });
+  document.getElementById('track-count').textContent="Tracks: "+(filtering()?count:manifest.track_count);
+  layout();
+}
+
+function itemHeight(it){ return it[1]<0?HEADER_H:(it[1]===expandedTrack?EXPANDED_H:ROW_H); }
+
+function layout(){
+  offsets=new Array(items.length+1);
+  offsets[0]=0;
+  for(let k=0;k<items.length;k++) offsets[k+1]=offsets[k]+itemHeight(items[k]);
+  document.getElementById('vlist').style.height=offsets[items.length]+'px';
+  lastRange='';
+  renderWindow();
+}
+
+function firstItemAt(y){
+  let lo=0, hi=items.length;
+  while(lo<hi){ const mid=(lo+hi)>>1; if(offsets[mid+1]<=y) lo=mid+1; else hi=mid; }
+  return lo;
+}
+
+function renderItem(it){
+  const [ci,id]=it;
+  const chart=manifest.charts[ci];
+  if(id<0){
+    const img=chart.image?`<img src="${esc(chart.thumb)}" srcset="${esc(chart.thumb)} 95w, ${esc(chart.image)} 500w" sizes="40px" data-full="${esc(chart.image)}" alt="${esc(chart.name)}" width="40" height="40" loading="lazy" decoding="async">`:'';
+    const date=chart.date?`<span class="chart-date">${esc(chart.date)}</span>`:'';
+    return `<div class="chart-header" data-ci="${ci}">${img}<div class="chart-header-text">📀 ${esc(chart.name)} ${date}</div></div>`;
+  }
+  const t=trackRow(ci,id);
+  if(!t){ loadShard(ci); return `<div class="track loading" data-ci="${ci}" data-id="${id}">…</div>`; }
+  const [artist,title,genre,label,labelImg,artwork,date,dateDisplay,isDup]=t;
+  const colors=data[ci].colors;
+  let box='';
+  if(id===expandedTrack){
+    box=(artwork?`<img src="${esc(artwork)}" width="400" height="400" decoding="async">`:'')+(labelImg?`<img class="label-img" src="${esc(labelImg)}" width="400" height="400" decoding="async">`:'');
+  }
+  return `<div class="track${id===expandedTrack?' expanded':''}" data-ci="${ci}" data-id="${id}">`+
+    `<div class="song-line"><div class="track-left">`+
+    `<span class="date-tag">${esc(dateDisplay)}</span>`+
+    `<span class="genre-tag" style="background:${colors[genre]}">[${esc(genre)}]</span>`+
+    `<span class="track-title">${esc(artist)} – ${esc(title)}</span>`+
+    `<span class="label-tag" style="background:${colors[label]}">[${esc(label)}]</span>`+
+    (isDup?'<span class="duplicate">⚠️</span>':'')+
+    `</div></div><div class="artwork-box">${box}</div></div>`;
+}
+
+function renderWindow(){
+  const list=document.getElementById('vlist');
+  const top=list.getBoundingClientRect().top;
+  const start=Math.max(0,firstItemAt(Math.max(0,-top))-OVERSCAN);
+  const end=Math.min(items.length,firstItemAt(-top+window.innerHeight)+1+OVERSCAN);
+  const range=start+':'+end;
+  if(range===lastRange) return;
+  lastRange=range;
+  const win=document.getElementById('vwindow');
+  win.style.top=(offsets[start]||0)+'px';
+  win.innerHTML=items.slice(start,end).map(renderItem).join('');
+}
+
+function refresh(){ if(manifest) buildItems(); }
+
+let scrollPending=false;
+function onScroll(){
+  if(scrollPending) return;
+  scrollPending=true;
+  requestAnimationFrame(()=>{ scrollPending=false; renderWindow(); });
+}
+window.addEventListener('scroll',onScroll);
+window.addEventListener('resize',onScroll);
+
+function applyFilters(){ refresh(); }
+
+function setFilter(kind,value){
+  if(kind==='genre') activeGenre=(activeGenre===value)?null:value;
+  if(kind==='label') activeLabel=(activeLabel===value)?null:value;
+  if(kind==='date') activeDate=(activeDate===value)?null:value;
+  document.querySelectorAll('.genre-filter').forEach(t=>t.classList.toggle('active',t.dataset.genre===activeGenre));
+  if(filtering() && !searchIndex) loadAll();
+  refresh();
+}
+
+fetch(DATA_DIR+'manifest.json').then(r=>r.json()).then(m=>{
+  manifest=m;
+  document.getElementById('genre-sidebar').insertAdjacentHTML('beforeend',m.genres.map(([g,color])=>
+    `<span class="genre-filter" style="background:${color}" data-genre="${esc(g)}">[${esc(g)}]</span>`).join(''));
+  refresh();
+  loadSearchIndex(DATA_DIR+'search-index.json',m.track_count);
+});
+
+function trackOf(el){
+  const row=el.closest('.track');
+  return row && !row.classList.contains('loading')?[+row.dataset.ci,+row.dataset.id]:null;
+}
+
+document.addEventListener('click',e=>{
+  const el=e.target;
+  if(el.closest('.genre-filter')){ setFilter('genre',el.closest('.genre-filter').dataset.genre); return; }
+  const tr=trackOf(el);
+  if(tr){
+    const t=trackRow(tr[0],tr[1]);
+    if(el.closest('.genre-tag')){ setFilter('genre',t[2]); return; }
+    if(el.closest('.label-tag')){ setFilter('label',t[3]); return; }
+    if(el.closest('.date-tag')){ setFilter('date',t[6]); return; }
+    if(el.closest('.track-title')){ expandedTrack=(expandedTrack===tr[1])?-1:tr[1]; layout(); return; }
+  }
+  const header=el.closest('.chart-header');
+  if(header){
+    const ci=+header.dataset.ci;
+    if(expanded.has(ci)) expanded.delete(ci); else expanded.add(ci);
+    refresh();
+  }
+});
+
+document.getElementById('expand-collapse-btn').addEventListener('click',()=>{
+  manifest.charts.forEach((c,ci)=>{ if(expanded.has(ci)) expanded.delete(ci); else expanded.add(ci); });
+  refresh();
+});
+
+const searchInput=document.getElementById('search-input');
+searchInput.addEventListener('input',()=>{
+  searchTerm=searchInput.value.toLowerCase();
+  if(searchTerm && !searchIndex) loadAll();
+  refresh();
+});
+
+let tooltip=null;
+let preview=null;
+document.addEventListener('mouseover',e=>{
+  const icon=e.target.closest('.duplicate');
+  if(icon && !tooltip){
+    const [ci,id]=trackOf(icon);
+    const chartName=manifest.charts[ci].name;
+    const otherCharts=trackRow(ci,id)[9].split('|').filter(c=>c!==chartName);
+    if(otherCharts.length===0) return;
+    tooltip=document.createElement('div');
+    tooltip.className='dup-tooltip';
+    tooltip.textContent=otherCharts.join(', ');
+    document.body.appendChild(tooltip);
+  }
+  const img=e.target.closest('.chart-header img');
+  if(img && !preview && img.src){
+    preview=document.createElement('div');
+    preview.className='hover-preview';
+    const previewImg=document.createElement('img');
+    previewImg.src=img.dataset.full||img.src;
+    preview.appendChild(previewImg);
+    document.body.appendChild(preview);
+  }
+});
+document.addEventListener('mousemove',e=>{
+  if(tooltip){ tooltip.style.left=e.clientX+10+'px'; tooltip.style.top=e.clientY+10+'px'; }
+  if(preview){ preview.style.left=e.clientX+20+'px'; preview.style.top=e.clientY+20+'px'; }
+});
+document.addEventListener('mouseout',e=>{
+  if(tooltip && e.target.closest('.duplicate')){ tooltip.remove(); tooltip=null; }
+  if(preview && e.target.closest('.chart-header img')){ preview.remove(); preview=null; }
+});
+"""
+
+def render_site():
+    cache = load_render_cache()
+    image_mirror.clear()
+    image_mirror.update(store.load_image_mirror())
+    charts = get_charts()
+    track_count = store.conn.execute("SELECT COUNT(*) FROM chart_tracks").fetchone()[0]
+    genres = [g for (g,) in store.conn.execute(
+        "SELECT DISTINCT t.genre FROM chart_tracks ct JOIN tracks t ON t.id=ct.track_id ORDER BY t.genre")]
+    if OUTPUT_MODE == "sharded":
+        render_sharded_site(cache, charts, track_count, genres)
+    else:
+        render_html_site(cache, charts, track_count, genres)
+
+def output_bytes():
+    total = os.path.getsize(OUTPUT_FILE) if os.path.exists(OUTPUT_FILE) else 0
+    if OUTPUT_MODE == "sharded":
+        for root, _, files in os.walk(DATA_DIR):
+            total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
@@ -0,0 +1,132 @@
+import functools
+import http.server
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+from . import render, store
+
+# ============================
+# Query server settings
+# ============================
+SERVE_HOST = os.getenv("SERVE_HOST", "127.0.0.1")
+SERVE_PORT = int(os.getenv("SERVE_PORT", "8000"))
+MAX_PER_PAGE = 200
+MAX_FACETS = 500
+
+# ============================
+# Read-only DB connection per request thread
+# ============================
+local = threading.local()
+
+def db():
+    if not hasattr(local, "conn"):
+        path = os.path.abspath(store.DB_FILE)
+        local.conn = sqlite3.connect(f"file:{urllib.parse.quote(path)}?mode=ro", uri=True)
+    return local.conn
+
+def int_param(params, name, default, low, high):
+    try: value = int(params.get(name, default))
+    except ValueError: value = default
+    return max(low, min(high, value))
+
+# ============================
+# JSON API (/api/search, /api/facets) next to the static site
+# ============================
+def api_search(params):
+    page = int_param(params, "page", 1, 1, 1000000)
+    per_page = int_param(params, "per_page", 50, 0, MAX_PER_PAGE)
+    total, results = store.search_tracks(db(), params.get("q", ""), params, page, per_page)
+    return {"total": total, "page": page, "per_page": per_page, "results": results}
+
+def api_facets(params):
+    limit = int_param(params, "limit", 50, 1, MAX_FACETS)
+    return {"facets": store.track_facets(db(), params.get("q", ""), params, limit)}
+
+API_ROUTES = {
+    "/api/search": api_search,
+    "/api/facets": api_facets,
+}
+
+# ============================
+# Static files: the rendered site only, never the DB, the HTTP cache or the repo
+# ============================
+SITE_FILES = {os.path.basename(render.OUTPUT_FILE), "search-index.json"}
+SITE_DIRS = {os.path.basename(render.ASSETS_DIR), os.path.basename(render.DATA_DIR), os.path.basename(render.IMAGE_DIR)}
+
+def site_path(path):
+    parts = [part for part in urllib.parse.unquote(path).split("/") if part]
+    if not parts: return True
+    if any(part.startswith(".") for part in parts): return False
+    return parts[0] in SITE_FILES if len(parts) == 1 else parts[0] in SITE_DIRS
+
+# The page only queries the API when this tag is present, so static hosts never see the request
+API_FLAG = b'<meta name="beatracks-api" content="api/">'
+
+class Handler(http.server.SimpleHTTPRequestHandler):
+    def send_page(self):
+        try:
+            with open(os.path.join(self.directory, os.path.basename(render.OUTPUT_FILE)), "rb") as f:
+                html = f.read()
+        except OSError:
+            return self.send_error(404, "No page yet - run `python app.py render` first")
+        html = html.replace(b"<body>", API_FLAG + b"<body>", 1)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(html)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(html)
+
+    def do_HEAD(self):
+        if not site_path(urllib.parse.urlsplit(self.path).path):
+            return self.send_error(404)
+        super().do_HEAD()
+
+    def list_directory(self, path):
+        self.send_error(404)
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path not in API_ROUTES:
+            if not site_path(url.path):
+                return self.send_error(404)
+            if url.path in ("/", "/" + os.path.basename(render.OUTPUT_FILE)):
+                return self.send_page()
+            return super().do_GET()
+        params = dict(urllib.parse.parse_qsl(url.query))
+        start = time.perf_counter()
+        try:
+            body = API_ROUTES[url.path](params)
+            status = 200
+        except sqlite3.Error as e:
+            status = 500
+            body = {"error": str(e)}
+        body["ms"] = round((time.perf_counter() - start) * 1000, 2)
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(data)
+
+def serve(host=None, port=None):
+    host, port = host or SERVE_HOST, port or SERVE_PORT
+    conn = sqlite3.connect(store.DB_FILE)
+    store.migrate_db(conn)
+    searchable = store.search_available(conn)
+    conn.close()
+    if not searchable:
+        print("⚠️  No tracks_fts table (SQLite without FTS5?) - text queries fall back to a substring scan")
+    site_dir = os.path.dirname(os.path.abspath(render.OUTPUT_FILE))
+    handler = functools.partial(Handler, directory=site_dir)
+    with http.server.ThreadingHTTPServer((host, port), handler) as httpd:
+        print(f"🌐 Serving {site_dir} and /api/search, /api/facets on http://{host}:{port}/")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            print("👋 Server stopped")
@@ -0,0 +1,804 @@
+import itertools
+import json
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from datetime import datetime
+
+from .metrics import count, timed
+
+# ============================
+# Store settings
+# ============================
+DB_FILE = "beatport_links.db"
+LABEL_CACHE_TTL_DAYS = float(os.getenv("LABEL_CACHE_TTL_DAYS", "30"))
+LABEL_CACHE_NEGATIVE_TTL_DAYS = float(os.getenv("LABEL_CACHE_NEGATIVE_TTL_DAYS", "1"))
+# Discovered charts that fail: wait CRAWL_RETRY_HOURS, doubled after each attempt, and give up
+# after CRAWL_MAX_ATTEMPTS (a 404 gives up at once)
+CRAWL_RETRY_HOURS = float(os.getenv("CRAWL_RETRY_HOURS", "6"))
+CRAWL_MAX_ATTEMPTS = max(1, int(os.getenv("CRAWL_MAX_ATTEMPTS", "5")))
+
+# ============================
+# Track identity: one key for the same recording across charts
+# ============================
+# Case, accents, punctuation, "Original Mix" and artist order do not make a
+# different track, and a feat. credit counts the same in the artist or the title.
+# Remixes and other mixes still do.
+# An unbracketed credit ("Song feat. B Extended Mix") ends at the next bracket or mix suffix
+MIX_SUFFIX = (r"\s+(?:(?:original|extended|radio|club|dub|instrumental|vocal|acoustic|short|long)\s+)*"
+              r"(?:mix|remix|edit|dub|version|rework|bootleg|vip|remaster(?:ed)?)\b")
+# Outside brackets "ft"/"feat" need their period ("Six ft Under" is a title, not a credit)
+FEAT_WORD = r"(?:(?:feat|ft)\.|featuring\b)"
+FEAT_RE = re.compile(r"[(\[]\s*(?:feat|ft|featuring)\b\.?([^)\]]*)[)\]]"
+                     r"|\s" + FEAT_WORD + r"(.+?)(?=\s*[(\[]|" + MIX_SUFFIX + r"|$)")
+ARTIST_SEP_RE = re.compile(r"\s*(?:,|&|\sx\s|\b" + FEAT_WORD + r"|\bvs\b\.?)\s*")
+ORIGINAL_MIX_RE = re.compile(r"\boriginal mix\b")
+
+def fold_text(text):
+    if not text or text.isascii(): return (text or "").lower()
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+def words(text):
+    return " ".join(re.split(r"[\W_]+", text)).strip()
+
+def track_identity(artist, title):
+    title = fold_text(title)
+    # Featured artists named in the title join the artist set
+    featured = [name for m in FEAT_RE.finditer(title) for name in m.groups() if name]
+    title = ORIGINAL_MIX_RE.sub("", words(FEAT_RE.sub(" ", title)))
+    artists = sorted({words(a) for a in ARTIST_SEP_RE.split(", ".join([fold_text(artist)] + featured))} - {""})
+    return ",".join(artists) + "|" + " ".join(title.split())
+
+# ============================
+# DB schema migrations (PRAGMA user_version)
+# ============================
+def migrate_v1_legacy_tables(c):
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS weekly_links (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chart_name TEXT,
+        chart_date_created TEXT,
+        chart_image TEXT,
+        artist TEXT,
+        title TEXT,
+        url TEXT,
+        genre TEXT,
+        label TEXT,
+        label_img TEXT,
+        artwork TEXT,
+        release_dt TEXT,
+        release_str TEXT,
+        is_duplicate INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS label_cache (
+        label_href TEXT PRIMARY KEY,
+        label TEXT,
+        label_img TEXT,
+        fetched_at REAL
+    )
+    """)
+
+def migrate_v2_normalized_schema(c):
+    c.execute("""
+    CREATE TABLE charts (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        url TEXT,
+        date_created TEXT,
+        image TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    c.execute("""
+    CREATE TABLE labels (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        image TEXT NOT NULL DEFAULT ''
+    )
+    """)
+    c.execute("""
+    CREATE TABLE tracks (
+        id INTEGER PRIMARY KEY,
+        artist TEXT NOT NULL,
+        title TEXT NOT NULL,
+        genre TEXT,
+        label_id INTEGER NOT NULL REFERENCES labels(id),
+        artwork TEXT,
+        release_dt TEXT,
+        release_str TEXT,
+        UNIQUE (artist, title)
+    )
+    """)
+    c.execute("""
+    CREATE TABLE chart_tracks (
+        id INTEGER PRIMARY KEY,
+        chart_id INTEGER NOT NULL REFERENCES charts(id),
+        track_id INTEGER NOT NULL REFERENCES tracks(id),
+        is_duplicate INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (chart_id, track_id)
+    )
+    """)
+    c.execute("CREATE INDEX idx_chart_tracks_track ON chart_tracks(track_id)")
+    c.execute("CREATE INDEX idx_tracks_label ON tracks(label_id)")
+
+    # Convert the old one-row-per-track table in place
+    c.execute("""
+        INSERT INTO charts (name, url, date_created, image, created_at)
+        SELECT chart_name, url, chart_date_created, chart_image, MIN(created_at)
+        FROM weekly_links GROUP BY chart_name ORDER BY MIN(id)
+    """)
+    c.execute("""
+        INSERT INTO labels (name, image)
+        SELECT COALESCE(label, 'Unknown'), MAX(COALESCE(label_img, ''))
+        FROM weekly_links GROUP BY COALESCE(label, 'Unknown') ORDER BY MIN(id)
+    """)
+    c.execute("""
+        INSERT OR IGNORE INTO tracks (artist, title, genre, label_id, artwork, release_dt, release_str)
+        SELECT w.artist, w.title, w.genre, l.id, w.artwork, w.release_dt, w.release_str
+        FROM weekly_links w JOIN labels l ON l.name=COALESCE(w.label, 'Unknown')
+        ORDER BY w.id
+    """)
+    c.execute("""
+        INSERT OR IGNORE INTO chart_tracks (id, chart_id, track_id, is_duplicate, created_at)
+        SELECT w.id, ch.id, t.id, w.is_duplicate, w.created_at
+        FROM weekly_links w
+        JOIN charts ch ON ch.name=w.chart_name
+        JOIN tracks t ON t.artist=w.artist AND t.title=w.title
+        ORDER BY w.id
+    """)
+    c.execute("DROP TABLE weekly_links")
+
+    create_weekly_links_view(c)
+
+def create_weekly_links_view(c):
+    # Old flat layout stays readable as a view
+    c.execute("""
+    CREATE VIEW weekly_links AS
+    SELECT ct.id AS id, ch.name AS chart_name, ch.date_created AS chart_date_created, ch.image AS chart_image,
+           t.artist, t.title, ch.url, t.genre, l.name AS label, l.image AS label_img, t.artwork,
+           t.release_dt, t.release_str, ct.is_duplicate, ct.created_at
+    FROM chart_tracks ct
+    JOIN charts ch ON ch.id=ct.chart_id
+    JOIN tracks t ON t.id=ct.track_id
+    JOIN labels l ON l.id=t.label_id
+    """)
+
+def migrate_v3_render_cache(c):
+    c.execute("""
+    CREATE TABLE render_cache (
+        key TEXT PRIMARY KEY,
+        content_hash TEXT,
+        html BLOB
+    )
+    """)
+
+def migrate_v4_image_mirror(c):
+    # thumb/large are paths relative to the page; both empty when the download failed
+    c.execute("""
+    CREATE TABLE images (
+        url TEXT PRIMARY KEY,
+        thumb TEXT NOT NULL DEFAULT '',
+        large TEXT NOT NULL DEFAULT '',
+        fetched_at REAL
+    )
+    """)
+
+def migrate_v5_chart_order_index(c):
+    # (chart_id, rowid) order: a chart's tracks in insertion order without a sort
+    c.execute("CREATE INDEX IF NOT EXISTS idx_chart_tracks_chart ON chart_tracks(chart_id)")
+
+def migrate_v6_crawl_state(c):
+    # Beatport chart IDs already seen (discovered on a listing or ingested directly) and,
+    # per listing, the highest chart ID found there
+    c.execute("""
+    CREATE TABLE crawl_charts (
+        chart_id INTEGER PRIMARY KEY,
+        url TEXT NOT NULL,
+        source TEXT NOT NULL DEFAULT '',
+        first_seen REAL NOT NULL,
+        ingested_at REAL
+    )
+    """)
+    c.execute("""
+    CREATE TABLE crawl_sources (
+        url TEXT PRIMARY KEY,
+        high_water INTEGER NOT NULL DEFAULT 0,
+        last_crawled REAL
+    )
+    """)
+    # Charts already in the DB count as ingested; the ID is the URL's trailing number
+    c.execute("""
+        INSERT OR IGNORE INTO crawl_charts (chart_id, url, first_seen, ingested_at)
+        SELECT CAST(substr(u, length(rtrim(u, '0123456789')) + 1) AS INTEGER), url, now, now
+        FROM (SELECT url, rtrim(url, '/') AS u, CAST(strftime('%s', COALESCE(created_at, 'now')) AS REAL) AS now FROM charts WHERE url LIKE '%/chart/%')
+        WHERE u GLOB '*[0-9]'
+    """)
+
+def migrate_v7_track_identity(c):
+    # identity groups the same recording under different spellings; beatport_id is
+    # Beatport's track ID when the chart page had it. `backfill` recomputes both flags and keys.
+    c.execute("ALTER TABLE tracks ADD COLUMN beatport_id INTEGER")
+    c.execute("ALTER TABLE tracks ADD COLUMN identity TEXT")
+    c.executemany("UPDATE tracks SET identity=? WHERE id=?",
+                  [(track_identity(artist, title), track_id)
+                   for track_id, artist, title in c.execute("SELECT id, artist, title FROM tracks").fetchall()])
+    c.execute("CREATE INDEX idx_tracks_identity ON tracks(identity)")
+    c.execute("CREATE INDEX idx_tracks_beatport_id ON tracks(beatport_id) WHERE beatport_id IS NOT NULL")
+
+def create_track_search(c):
+    # Full-text index over artist, title and label for the query server. Triggers keep it
+    # in step with every insert into tracks, so the ingest path needs no extra statements.
+    c.execute("""
+    CREATE VIRTUAL TABLE tracks_fts USING fts5(artist, title, label, tokenize='unicode61 remove_diacritics 2')
+    """)
+    c.execute("""
+        INSERT INTO tracks_fts (rowid, artist, title, label)
+        SELECT t.id, t.artist, t.title, l.name FROM tracks t JOIN labels l ON l.id=t.label_id
+    """)
+    create_track_search_triggers(c)
+
+def create_track_search_triggers(c):
+    c.execute("""
+    CREATE TRIGGER tracks_fts_insert AFTER INSERT ON tracks BEGIN
+        INSERT INTO tracks_fts (rowid, artist, title, label)
+        VALUES (new.id, new.artist, new.title, (SELECT name FROM labels WHERE id=new.label_id));
+    END
+    """)
+    c.execute("""
+    CREATE TRIGGER tracks_fts_delete AFTER DELETE ON tracks BEGIN
+        DELETE FROM tracks_fts WHERE rowid=old.id;
+    END
+    """)
+
+def migrate_v8_track_search(c):
+    # Newest-first listing for searches without a text query
+    c.execute("CREATE INDEX idx_tracks_release ON tracks(release_dt)")
+    # SQLite builds without FTS5 skip the index; `backfill` creates it once FTS5 is available
+    try:
+        create_track_search(c)
+    except sqlite3.OperationalError as e:
+        if "fts5" not in str(e): raise
+        print("⚠️  SQLite has no FTS5 - full-text search disabled")
+
+def migrate_v9_tracks_per_release(c):
+    # One tracks row per Beatport track ID, so the same artist/title on another release keeps
+    # its own label, artwork and dates. Only rows without an ID are still keyed on artist/title.
+    # SQLite cannot drop a table constraint, so the table is rebuilt (view and triggers with it).
+    c.execute("DROP VIEW weekly_links")
+    c.execute("""
+    CREATE TABLE tracks_v9 (
+        id INTEGER PRIMARY KEY,
+        artist TEXT NOT NULL,
+        title TEXT NOT NULL,
+        genre TEXT,
+        label_id INTEGER NOT NULL REFERENCES labels(id),
+        artwork TEXT,
+        release_dt TEXT,
+        release_str TEXT,
+        beatport_id INTEGER,
+        identity TEXT
+    )
+    """)
+    c.execute("""
+        INSERT INTO tracks_v9 (id, artist, title, genre, label_id, artwork, release_dt, release_str, beatport_id, identity)
+        SELECT id, artist, title, genre, label_id, artwork, release_dt, release_str, beatport_id, identity FROM tracks
+    """)
+    c.execute("DROP TABLE tracks")
+    c.execute("ALTER TABLE tracks_v9 RENAME TO tracks")
+    # Differently spelled rows that were given the same ID: the first one keeps it
+    c.execute("""
+        UPDATE tracks SET beatport_id=NULL
+        WHERE beatport_id IS NOT NULL AND id > (SELECT MIN(o.id) FROM tracks o WHERE o.beatport_id=tracks.beatport_id)
+    """)
+    c.execute("CREATE UNIQUE INDEX idx_tracks_beatport_id ON tracks(beatport_id) WHERE beatport_id IS NOT NULL")
+    c.execute("CREATE UNIQUE INDEX idx_tracks_artist_title ON tracks(artist, title) WHERE beatport_id IS NULL")
+    c.execute("CREATE INDEX idx_tracks_label ON tracks(label_id)")
+    c.execute("CREATE INDEX idx_tracks_identity ON tracks(identity)")
+    c.execute("CREATE INDEX idx_tracks_release ON tracks(release_dt)")
+    create_weekly_links_view(c)
+    if c.execute("SELECT 1 FROM sqlite_master WHERE name='tracks_fts'").fetchone():
+        create_track_search_triggers(c)
+
+def migrate_v10_crawl_resume(c):
+    # Page to pick a listing walk up from when the last one stopped early (fetch error or
+    # DISCOVER_MAX_PAGES); NULL once the walk has reached high_water
+    c.execute("ALTER TABLE crawl_sources ADD COLUMN resume_page INTEGER")
+
+def migrate_v11_crawl_attempts(c):
+    # Failed fetches (or pages without tracks) of discovered charts; gave_up_at ends the retries
+    c.execute("ALTER TABLE crawl_charts ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+    c.execute("ALTER TABLE crawl_charts ADD COLUMN last_attempt REAL")
+    c.execute("ALTER TABLE crawl_charts ADD COLUMN gave_up_at REAL")
+
+SCHEMA_MIGRATIONS = [
+    migrate_v1_legacy_tables,
+    migrate_v2_normalized_schema,
+    migrate_v3_render_cache,
+    migrate_v4_image_mirror,
+    migrate_v5_chart_order_index,
+    migrate_v6_crawl_state,
+    migrate_v7_track_identity,
+    migrate_v8_track_search,
+    migrate_v9_tracks_per_release,
+    migrate_v10_crawl_resume,
+    migrate_v11_crawl_attempts,
+]
+
+def migrate_db(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= len(SCHEMA_MIGRATIONS): return
+    for target in range(version + 1, len(SCHEMA_MIGRATIONS) + 1):
+        print(f"🗄️  Migrating DB schema to v{target}...")
+        c = conn.cursor()
+        c.execute("BEGIN")
+        try:
+            SCHEMA_MIGRATIONS[target - 1](c)
+            c.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+        except:
+            conn.rollback()
+            raise
+    conn.execute("VACUUM")
+
+# ============================
+# Open DB (one connection shared by the whole run)
+# ============================
+conn = None
+
+def open_db(path=DB_FILE):
+    global conn
+    conn = sqlite3.connect(path)
+    migrate_db(conn)
+    conn.execute("""
+    CREATE TEMP TABLE incoming_tracks (
+        pos INTEGER, artist TEXT, title TEXT, genre TEXT, label TEXT, label_img TEXT,
+        artwork TEXT, release_dt TEXT, release_str TEXT, beatport_id INTEGER, identity TEXT, track_id INTEGER
+    )
+    """)
+    return conn
+
+# ============================
+# Function to check if chart already exists in DB
+# ============================
+def chart_already_exists(chart_name):
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM charts WHERE name=? LIMIT 1", (chart_name,))
+    return c.fetchone() is not None
+
+def chart_url(chart_name):
+    row = conn.execute("SELECT url FROM charts WHERE name=?", (chart_name,)).fetchone()
+    return row[0] if row else None
+
+# ============================
+# Crawl state: chart IDs seen on listings, high-water mark per listing
+# ============================
+def chart_ingested(chart_id):
+    row = conn.execute("SELECT ingested_at FROM crawl_charts WHERE chart_id=?", (chart_id,)).fetchone()
+    return row is not None and row[0] is not None
+
+def seen_chart_ids(chart_ids):
+    c = conn.execute("SELECT chart_id FROM crawl_charts WHERE chart_id IN (SELECT value FROM json_each(?))",
+                     (json.dumps(list(chart_ids)),))
+    return {chart_id for (chart_id,) in c.fetchall()}
+
+def crawl_state(source):
+    # (high_water, resume_page) for a listing
+    row = conn.execute("SELECT high_water, resume_page FROM crawl_sources WHERE url=?", (source,)).fetchone()
+    return tuple(row) if row else (0, None)
+
+def record_discovered(source, charts, resume_page=None):
+    # charts: [(chart_id, url)] found on the listing; not ingested yet. high_water only moves
+    # once a walk gets all the way down to it, otherwise the walk resumes at resume_page.
+    now = time.time()
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO crawl_charts (chart_id, url, source, first_seen) VALUES (?,?,?,?)",
+                         [(chart_id, url, source, now) for chart_id, url in charts])
+        high_water = 0
+        if resume_page is None:
+            high_water = conn.execute("SELECT MAX(chart_id) FROM crawl_charts WHERE source=?", (source,)).fetchone()[0] or 0
+        conn.execute("""
+            INSERT INTO crawl_sources (url, high_water, last_crawled, resume_page) VALUES (?,?,?,?)
+            ON CONFLICT(url) DO UPDATE SET high_water=MAX(high_water, excluded.high_water),
+                last_crawled=excluded.last_crawled, resume_page=excluded.resume_page
+        """, (source, high_water, now, resume_page))
+
+def pending_crawl_urls():
+    # Discovered charts not ingested yet, skipping those still waiting out a failed attempt
+    now = time.time()
+    c = conn.execute("""
+        SELECT url, attempts, last_attempt FROM crawl_charts
+        WHERE ingested_at IS NULL AND gave_up_at IS NULL ORDER BY chart_id DESC
+    """)
+    return [url for url, attempts, last_attempt in c.fetchall()
+            if not attempts or now - last_attempt >= CRAWL_RETRY_HOURS * 3600 * 2 ** (attempts - 1)]
+
+def record_chart_failure(chart_id, permanent=False):
+    # Only discovered charts are retried; returns True once the chart has been given up on
+    now = time.time()
+    with conn:
+        conn.execute("""
+            UPDATE crawl_charts SET attempts=attempts+1, last_attempt=?,
+                gave_up_at=CASE WHEN ? OR attempts+1 >= ? THEN ? END
+            WHERE chart_id=? AND ingested_at IS NULL AND gave_up_at IS NULL
+        """, (now, permanent, CRAWL_MAX_ATTEMPTS, now, chart_id))
+    row = conn.execute("SELECT gave_up_at FROM crawl_charts WHERE chart_id=?", (chart_id,)).fetchone()
+    return bool(row and row[0])
+
+def mark_chart_ingested(chart_id, url):
+    now = time.time()
+    with conn:
+        conn.execute("""
+            INSERT INTO crawl_charts (chart_id, url, first_seen, ingested_at) VALUES (?,?,?,?)
+            ON CONFLICT(chart_id) DO UPDATE SET ingested_at=excluded.ingested_at
+        """, (chart_id, url, now, now))
+
+# ============================
+# Persistent label image cache (SQLite, with TTL)
+# ============================
+def load_label_cache(unique_labels):
+    # unique_labels: {label: label_href} -> {label: label_img} for entries still fresh
+    now = time.time()
+    hits = {}
+    c = conn.cursor()
+    for label, label_href in unique_labels.items():
+        c.execute("SELECT label_img, fetched_at FROM label_cache WHERE label_href=?", (label_href,))
+        row = c.fetchone()
+        if row:
+            label_img, fetched_at = row
+            # NULL: the last lookup failed (see failed_label_lookups)
+            if label_img is None: continue
+            ttl_days = LABEL_CACHE_TTL_DAYS if label_img else LABEL_CACHE_NEGATIVE_TTL_DAYS
+            if now - fetched_at < ttl_days * 86400:
+                hits[label] = label_img
+            # Expired entries are looked up again
+            continue
+        # Labels never looked up: an image stored with earlier tracks seeds the cache
+        c.execute("SELECT image FROM labels WHERE name=? AND image!=''", (label,))
+        row = c.fetchone()
+        if row:
+            hits[label] = row[0]
+            c.execute("INSERT OR REPLACE INTO label_cache VALUES (?,?,?,?)", (label_href, label, row[0], now))
+    conn.commit()
+    count("label_cache_hits", len(hits))
+    return hits
+
+def save_label_cache(results, unique_labels):
+    # results: {label: label_img}; None records a failed lookup with the attempt time
+    now = time.time()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO label_cache VALUES (?,?,?,?)",
+            [(unique_labels[label], label, label_img, now) for label, label_img in results.items()]
+        )
+
+def failed_label_lookups():
+    # {label: label_href} for lookups that failed on an earlier run; every run tries them again
+    c = conn.execute("SELECT label, label_href FROM label_cache WHERE label_img IS NULL ORDER BY fetched_at")
+    return dict(c.fetchall())
+
+def update_label_images(images):
+    # Late label images (e.g. a retried lookup) for tracks already stored
+    with timed("db_write"), conn:
+        save_label_images(conn.cursor(), images)
+
+# ============================
+# Label images: stored on labels, shown by every chart with a track on that label
+# ============================
+def save_label_images(c, images):
+    # images: {label: image}; an empty image never replaces a stored one.
+    # Charts already showing a label whose image changes are rendered again.
+    rows = json.dumps([[label, image] for label, image in images.items()])
+    c.execute("""
+        DELETE FROM render_cache WHERE key IN (
+            SELECT kind || ':' || x.chart_id
+            FROM (SELECT 'chart' AS kind UNION ALL SELECT 'shard') JOIN (
+                SELECT DISTINCT ct.chart_id
+                FROM json_each(?1) j
+                JOIN labels l ON l.name=json_extract(j.value, '$[0]')
+                JOIN tracks t ON t.label_id=l.id
+                JOIN chart_tracks ct ON ct.track_id=t.id
+                WHERE json_extract(j.value, '$[1]') NOT IN ('', l.image)) x)
+    """, (rows,))
+    c.execute("""
+        INSERT INTO labels (name, image)
+        SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]') FROM json_each(?) WHERE true
+        ON CONFLICT(name) DO UPDATE SET image=excluded.image WHERE excluded.image!=''
+    """, (rows,))
+
+# ============================
+# Bulk add a chart's tracks to DB with duplicate marking (one transaction)
+# ============================
+def add_tracks_to_db(chart_name, chart_date_created, chart_image, url, tracks_data):
+    with timed("db_write"), conn:
+        c = conn.cursor()
+        c.execute("DELETE FROM incoming_tracks")
+        c.executemany("INSERT INTO incoming_tracks VALUES (?,?,?,?,?,?,?,?,?,?,?,NULL)", [
+            (pos, t["artist"], t["title"], t["genre"], t["label"], t["label_img"], t["artwork"],
+             t["release_dt"].isoformat() if t["release_dt"] else "", t["release_str"],
+             t.get("beatport_id"), track_identity(t["artist"], t["title"]))
+            for pos, t in enumerate(tracks_data)
+        ])
+        # A Beatport track ID seen before keeps the identity it was stored under
+        c.execute("""
+            UPDATE incoming_tracks SET identity=t.identity
+            FROM tracks t WHERE t.beatport_id=incoming_tracks.beatport_id
+        """)
+        c.execute("INSERT OR IGNORE INTO charts (name, url, date_created, image) VALUES (?,?,?,?)",
+                  (chart_name, url, chart_date_created, chart_image))
+        chart_id = c.execute("SELECT id FROM charts WHERE name=?", (chart_name,)).fetchone()[0]
+        label_images = {}
+        for t in tracks_data:
+            label_images[t["label"]] = max(label_images.get(t["label"], ""), t["label_img"] or "")
+        save_label_images(c, label_images)
+        c.execute("""
+            INSERT OR IGNORE INTO tracks (artist, title, genre, label_id, artwork, release_dt, release_str, beatport_id, identity)
+            SELECT i.artist, i.title, i.genre, l.id, i.artwork, i.release_dt, i.release_str, i.beatport_id, i.identity
+            FROM incoming_tracks i JOIN labels l ON l.name=i.label
+            ORDER BY i.pos
+        """)
+        # Rows are keyed on the Beatport ID, or on artist/title among rows without one
+        c.execute("""
+            UPDATE incoming_tracks SET track_id=t.id
+            FROM tracks t WHERE t.beatport_id=incoming_tracks.beatport_id
+        """)
+        c.execute("""
+            UPDATE incoming_tracks SET track_id=t.id
+            FROM tracks t WHERE incoming_tracks.beatport_id IS NULL AND t.beatport_id IS NULL
+                            AND t.artist=incoming_tracks.artist AND t.title=incoming_tracks.title
+        """)
+        # A track whose identity is already linked to another chart is a duplicate
+        c.execute("""
+            INSERT OR IGNORE INTO chart_tracks (chart_id, track_id, is_duplicate)
+            SELECT ?1, t.id, EXISTS (SELECT 1 FROM tracks o JOIN chart_tracks x ON x.track_id=o.id
+                                     WHERE o.identity=t.identity AND x.chart_id!=?1)
+            FROM incoming_tracks i JOIN tracks t ON t.id=i.track_id
+            ORDER BY i.pos
+        """, (chart_id,))
+        added = c.rowcount
+        # Charts sharing a track with this one show it in their "other charts" list
+        c.execute("""
+            DELETE FROM render_cache WHERE key IN (
+                SELECT kind || ':' || x.chart_id
+                FROM (SELECT 'chart' AS kind UNION ALL SELECT 'shard' UNION ALL SELECT 'index') JOIN chart_tracks x
+                WHERE x.track_id IN (
+                    SELECT o.id FROM chart_tracks ct JOIN tracks t ON t.id=ct.track_id JOIN tracks o ON o.identity=t.identity
+                    WHERE ct.chart_id=?))
+        """, (chart_id,))
+    count("rows_inserted", added)
+    count("rows_skipped", len(tracks_data) - added)
+    return added, len(tracks_data) - added
+
+# ============================
+# Backfill: identity keys and duplicate flags for tracks already in the DB
+# ============================
+def backfill_track_identity():
+    with timed("db_write"), conn:
+        c = conn.cursor()
+        changed = []
+        by_beatport_id = {}
+        for track_id, artist, title, identity, beatport_id in c.execute(
+                "SELECT id, artist, title, identity, beatport_id FROM tracks ORDER BY id").fetchall():
+            key = track_identity(artist, title)
+            # Tracks with the same Beatport ID share the first one's key
+            if beatport_id is not None:
+                key = by_beatport_id.setdefault(beatport_id, key)
+            if key != identity:
+                changed.append((key, track_id))
+        c.executemany("UPDATE tracks SET identity=? WHERE id=?", changed)
+        # Same rule as at insert time: the identity was already in another chart
+        c.execute("""
+            UPDATE chart_tracks SET is_duplicate=d.dup FROM (
+                SELECT ct.id, EXISTS (SELECT 1 FROM tracks o JOIN chart_tracks x ON x.track_id=o.id
+                                      WHERE o.identity=t.identity AND x.chart_id!=ct.chart_id AND x.id<ct.id) AS dup
+                FROM chart_tracks ct JOIN tracks t ON t.id=ct.track_id) d
+            WHERE chart_tracks.id=d.id AND chart_tracks.is_duplicate IS NOT d.dup
+        """)
+        flags = c.rowcount
+        if changed or flags:
+            c.execute("DELETE FROM render_cache WHERE key!='version'")
+    return len(changed), flags
+
+def rebuild_track_search():
+    # Drops and refills tracks_fts (and creates it on a DB migrated without FTS5)
+    with timed("db_write"), conn:
+        c = conn.cursor()
+        c.execute("DROP TRIGGER IF EXISTS tracks_fts_insert")
+        c.execute("DROP TRIGGER IF EXISTS tracks_fts_delete")
+        c.execute("DROP TABLE IF EXISTS tracks_fts")
+        try:
+            create_track_search(c)
+        except sqlite3.OperationalError as e:
+            if "fts5" not in str(e): raise
+            return None
+        return c.execute("SELECT COUNT(*) FROM tracks_fts").fetchone()[0]
+
+# ============================
+# Track search for the query server (callers pass their own read-only connection)
+# ============================
+SEARCH_FILTERS = {
+    "genre": "t.genre=?",
+    "label": "l.name=?",
+    "chart": "t.id IN (SELECT x.track_id FROM chart_tracks x JOIN charts ch ON ch.id=x.chart_id WHERE ch.name=?)",
+    "date_from": "substr(t.release_dt, 1, 10)>=?",
+    "date_to": "substr(t.release_dt, 1, 10)<=?",
+}
+FACET_COLUMNS = {
+    "genre": "t.genre",
+    "label": "l.name",
+    "date": "NULLIF(substr(t.release_dt, 1, 10), '')",
+}
+
+def search_available(c):
+    return c.execute("SELECT 1 FROM sqlite_master WHERE name='tracks_fts'").fetchone() is not None
+
+def fts_query(text):
+    # Every word must match, each as a prefix: "deep hou" -> "deep"* "hou"*
+    return " ".join(f'"{w}"*' for w in words(fold_text(text)).split())
+
+def search_where(c, text, filters):
+    # -> (FROM ... WHERE ..., params, ranked); tracks_fts is only joined when there is a text query
+    match = fts_query(text)
+    sql = "FROM tracks t JOIN labels l ON l.id=t.label_id"
+    clauses, params = [], []
+    if match and search_available(c):
+        sql = "FROM tracks_fts f JOIN tracks t ON t.id=f.rowid JOIN labels l ON l.id=t.label_id"
+        clauses.append("tracks_fts MATCH ?")
+        params.append(match)
+    elif match:
+        # No FTS5: a substring scan per word (unranked, and not accent-insensitive)
+        for w in words(text.lower()).split():
+            clauses.append("(t.artist || ' ' || t.title || ' ' || l.name) LIKE ?")
+            params.append(f"%{w}%")
+        match = ""
+    for name, value in filters.items():
+        if value and name in SEARCH_FILTERS:
+            clauses.append(SEARCH_FILTERS[name])
+            params.append(value)
+    if clauses: sql += " WHERE " + " AND ".join(clauses)
+    return sql, params, bool(match)
+
+def search_tracks(c, text, filters, page=1, per_page=50):
+    sql, params, ranked = search_where(c, text, filters)
+    total = c.execute(f"SELECT COUNT(*) {sql}", params).fetchone()[0]
+    order = "f.rank, t.id DESC" if ranked else "t.release_dt DESC, t.id DESC"
+    rows = c.execute(f"""
+        SELECT t.id, t.beatport_id, t.artist, t.title, t.genre, l.name, t.artwork, t.release_dt, t.release_str,
+               (SELECT json_group_array(name) FROM (
+                    SELECT ch.name FROM tracks o JOIN chart_tracks x ON x.track_id=o.id JOIN charts ch ON ch.id=x.chart_id
+                    WHERE o.identity=t.identity GROUP BY ch.id ORDER BY MIN(x.id)))
+        {sql} ORDER BY {order} LIMIT ? OFFSET ?
+    """, params + [per_page, (page - 1) * per_page]).fetchall()
+    results = [{
+        "id": track_id, "beatport_id": beatport_id, "artist": artist, "title": title, "genre": genre,
+        "label": label, "artwork": artwork, "release": release_dt[:10] if release_dt else release_str,
+        "charts": json.loads(charts),
+    } for track_id, beatport_id, artist, title, genre, label, artwork, release_dt, release_str, charts in rows]
+    return total, results
+
+def track_facets(c, text, filters, limit=50):
+    # Counts per genre, label and release date over the tracks matching the query
+    sql, params, _ = search_where(c, text, filters)
+    facets = {}
+    for name, column in FACET_COLUMNS.items():
+        rows = c.execute(f"""
+            SELECT {column} AS value, COUNT(*) {sql} GROUP BY value HAVING value IS NOT NULL
+            ORDER BY {'value DESC' if name == 'date' else 'COUNT(*) DESC, value'} LIMIT ?
+        """, params + [limit]).fetchall()
+        facets[name] = [{"value": value, "count": n} for value, n in rows]
+    return facets
+
+# ============================
+# Sort charts by date: newest on top
+# ============================
+def get_chart_sort_date(chart):
+    date_str = chart["date"]
+    if date_str:
+        try: return datetime.strptime(date_str, "%Y-%m-%d")
+        except: pass
+    return datetime.min
+
+# ============================
+# Chart rows for rendering
+# ============================
+def get_charts():
+    c = conn.cursor()
+    c.execute("SELECT id, name, date_created, image FROM charts ORDER BY id")
+    charts = [{"id": r[0], "name": r[1], "date": r[2], "image": r[3]} for r in c.fetchall()]
+    return sorted(charts, key=get_chart_sort_date, reverse=True)
+
+def iter_chart_tracks(chart_ids):
+    # One cursor over the given charts, grouped by chart (in chart id order), so the caller
+    # only holds one chart's rows at a time. The chart lists of tracks that appear in several
+    # charts come from a single aggregate over track identity instead of a subquery per row.
+    c = conn.cursor()
+    with timed("db_read"):
+        c.execute("""
+            WITH firsts AS (
+                SELECT t.identity, x.chart_id, MIN(x.id) AS first
+                FROM tracks t JOIN chart_tracks x ON x.track_id=t.id
+                WHERE t.identity IN (SELECT t.identity FROM chart_tracks ct JOIN tracks t ON t.id=ct.track_id
+                                     WHERE ct.chart_id IN (SELECT value FROM json_each(?1)))
+                GROUP BY t.identity, x.chart_id),
+            appearances AS (
+                SELECT identity, group_concat(name, '|') AS chart_names FROM (
+                    SELECT f.identity, ch.name FROM firsts f JOIN charts ch ON ch.id=f.chart_id
+                    ORDER BY f.identity, f.first)
+                GROUP BY identity HAVING COUNT(*) > 1)
+            SELECT ct.chart_id,
+                   t.artist, t.title, t.genre, l.name, l.image, t.artwork, t.release_dt, t.release_str, ct.is_duplicate,
+                   COALESCE(a.chart_names, ch.name)
+            FROM chart_tracks ct
+            JOIN charts ch ON ch.id=ct.chart_id
+            JOIN tracks t ON t.id=ct.track_id
+            JOIN labels l ON l.id=t.label_id
+            LEFT JOIN appearances a ON a.identity=t.identity
+            WHERE ct.chart_id IN (SELECT value FROM json_each(?1))
+            ORDER BY ct.chart_id, ct.id
+        """, (json.dumps(chart_ids),))
+    pending = set(chart_ids)
+    for chart_id, group in itertools.groupby(c, key=lambda r: r[0]):
+        pending.discard(chart_id)
+        yield chart_id, [r[1:] for r in group]
+    # Charts without tracks still get an (empty) group
+    for chart_id in pending:
+        yield chart_id, []
+
+# ============================
+# Image mirror
+# ============================
+def image_urls():
+    c = conn.cursor()
+    c.execute("""
+        SELECT artwork FROM tracks WHERE artwork!=''
+        UNION SELECT image FROM labels WHERE image!=''
+        UNION SELECT image FROM charts WHERE image!=''
+    """)
+    return [url for (url,) in c.fetchall()]
+
+def load_images():
+    c = conn.cursor()
+    c.execute("SELECT url, thumb, large, fetched_at FROM images")
+    return {url: (thumb, large, fetched_at) for url, thumb, large, fetched_at in c.fetchall()}
+
+def load_image_mirror():
+    c = conn.cursor()
+    c.execute("SELECT url, thumb, large FROM images WHERE large!=''")
+    return {url: (thumb, large) for url, thumb, large in c.fetchall()}
+
+def save_images(rows):
+    # rows: (url, thumb, large, fetched_at)
+    mirrored = json.dumps([url for url, _, large, _ in rows if large])
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO images VALUES (?,?,?,?)", rows)
+        # Charts showing a newly mirrored image are rendered again with the local path
+        conn.execute("""
+            DELETE FROM render_cache WHERE key IN (
+                SELECT kind || ':' || x.chart_id
+                FROM (SELECT 'chart' AS kind UNION ALL SELECT 'shard') JOIN (
+                    SELECT id AS chart_id FROM charts WHERE image IN (SELECT value FROM json_each(?1))
+                    UNION
+                    SELECT ct.chart_id FROM chart_tracks ct
+                    JOIN tracks t ON t.id=ct.track_id JOIN labels l ON l.id=t.label_id
+                    WHERE t.artwork IN (SELECT value FROM json_each(?1)) OR l.image IN (SELECT value FROM json_each(?1))
+                ) x)
+        """, (mirrored,))
+
+# ============================
+# Data sizes for the run report
+# ============================
+def data_sizes():
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return {
+        "charts": conn.execute("SELECT COUNT(*) FROM charts").fetchone()[0],
+        "tracks": conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0],
+        "chart_tracks": conn.execute("SELECT COUNT(*) FROM chart_tracks").fetchone()[0],
+        "labels": conn.execute("SELECT COUNT(*) FROM labels").fetchone()[0],
+        "db_bytes": conn.execute("PRAGMA page_count").fetchone()[0] * page_size,
+    }
@@ -0,0 +1,72 @@
+# ============================
+# Parse benchmark: time per page / per track for each parser backend,
+# plus the embedded-JSON extractor on pages that carry __NEXT_DATA__
+#
+#   python bench/bench_parse.py [page.html ...] [--repeat N]
+#
+# Pages default to bench/pages/*.html (save real charts with
+# `curl -A Mozilla/5.0 https://www.beatport.com/chart/... > bench/pages/x.html`).
+# With no saved pages a synthetic chart in Beatport's markup is used.
+# ============================
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from beatracks import parse
+import replay
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages")
+
+def available_backends():
+    return ["bs4"] + (["lxml"] if parse.lxml_html is not None else [])
+
+def extractors(html):
+    # DOM backends are timed with the JSON path switched off
+    parse.CHART_EXTRACT = "dom"
+    found = {backend: (lambda h, b=backend: parse.parse_chart_page(h, b)) for backend in available_backends()}
+    if parse.NEXT_DATA_MARKER in html:
+        found["json"] = parse.parse_chart_json
+    return found
+
+def comparable(parsed):
+    # label_img only exists in the JSON payload
+    date, image, tracks = parsed
+    return date, image, [{k: v for k, v in t.items() if k != "label_img"} for t in tracks]
+
+def bench_page(name, html, repeat):
+    results = {}
+    for backend, extract in extractors(html).items():
+        extract(html)  # warm-up
+        start = time.perf_counter()
+        for _ in range(repeat):
+            parsed = extract(html)
+        elapsed = (time.perf_counter() - start) / repeat
+        results[backend] = comparable(parsed)
+        tracks = max(len(parsed[2]), 1)
+        print(f"  {backend:5s} {elapsed * 1000:8.2f} ms/page  {elapsed * 1e6 / tracks:8.1f} µs/track  ({len(parsed[2])} tracks)")
+    if len({repr(r) for r in results.values()}) > 1:
+        print(f"  ⚠️  backends disagree on {name}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chart page parsing")
+    parser.add_argument("pages", nargs="*")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    pages = args.pages or sorted(glob.glob(os.path.join(PAGES_DIR, "*.html")))
+    if pages:
+        inputs = [(p, open(p, encoding="utf-8").read()) for p in pages]
+    else:
+        tracks = [replay.synthetic_track(i) for i in range(100)]
+        inputs = [("synthetic (100 tracks)", replay.synthetic_chart_page(tracks))]
+
+    print(f"Backends: {', '.join(available_backends())}")
+    for name, html in inputs:
+        print(f"📄 {name} ({len(html) // 1024} KB)")
+        bench_page(name, html, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# ============================
+# End-to-end benchmark: parse, ingest and render against synthetic histories
+#
+#   python bench/bench_pipeline.py [--sizes 1000,10000,100000] [--fixtures DIR]
+#   python bench/bench_pipeline.py --record https://www.beatport.com/chart/...  # save live pages as fixtures
+#
+# Runs fully offline: chart and label pages are replayed from bench/fixtures
+# (synthetic fixtures are generated when it is empty). Each history size runs
+# in its own process against a temporary DB, so timings and peak RSS do not
+# leak between sizes. Results are appended to bench/results/pipeline.jsonl and
+# compared with the previous run.
+# ============================
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+RESULTS_FILE = os.path.join(BENCH_DIR, "results", "pipeline.jsonl")
+
+sys.path.insert(0, REPO_DIR)
+import replay
+from beatracks import fetch, ingest, render, store
+from beatracks.parse import make_track, parse_chart_page
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# ============================
+# One history size (child process)
+# ============================
+def seed_history(replay, size, tracks_per_chart=100):
+    # Weekly charts going back in time, drawing from a pool so ~20% of entries repeat
+    import random
+    rng = random.Random(size)
+    pool = size * 4 // 5
+    week = datetime.date(2026, 3, 1)
+    for n in range(size // tracks_per_chart):
+        tracks = []
+        for i in rng.sample(range(100000, 100000 + pool), tracks_per_chart):
+            t = replay.synthetic_track(i)
+            track = make_track(t["artist"], t["title"], t["genre"], t["label"], t["label_href"],
+                               t["artwork"], t["release"])
+            track["label_img"] = f"https://geo-media.beatport.com/image_size/500x500/{t['label_href'].split('/')[-1]}.jpg"
+            tracks.append(track)
+        date = (week - datetime.timedelta(weeks=n)).isoformat()
+        store.add_tracks_to_db(f"History Chart {n:04d}", date, "", f"{replay.BEATPORT}/chart/history-{n:04d}/{n}", tracks)
+
+def run_size(size, fixtures_dir):
+    stages = {}
+    def stage(name, fn):
+        start = time.perf_counter()
+        fn()
+        stages[name] = {"s": round(time.perf_counter() - start, 4), "peak_rss_mb": round(peak_rss_mb(), 1)}
+
+    # Everything the app writes (DB, HTTP cache, index.html, data/) stays in the temp dir
+    os.chdir(tempfile.mkdtemp(prefix=f"bench-{size}-"))
+    adapter = replay.install(fixtures_dir)
+    # Replayed pages are local: measure the pipeline, not the per-host rate limit
+    fetch.RATE_LIMIT = fetch.RATE_BURST = float("inf")
+    urls = replay.fixture_chart_urls(fixtures_dir)
+    pages = [open(os.path.join(fixtures_dir, url[len(replay.BEATPORT) + 1:] + ".html"), encoding="utf-8").read()
+             for url in urls]
+
+    store.open_db("beatport_links.db")
+    stage("seed", lambda: seed_history(replay, size))
+    stage("parse", lambda: [parse_chart_page(html) for html in pages])
+    stage("ingest", lambda: ingest.ingest_charts(urls))
+    render.OUTPUT_MODE = "html"
+    stage("render_html", render.render_site)
+    stage("render_html_warm", render.render_site)
+    render.OUTPUT_MODE = "sharded"
+    stage("render_sharded", render.render_site)
+    store.conn.close()
+
+    return {"tracks": size, "charts": len(urls), "http_requests": adapter.requests, "stages": stages}
+
+def child_main(size, fixtures_dir):
+    # beatracks prints progress; keep stdout for the JSON result
+    real_stdout = sys.stdout
+    sys.stdout = sys.stderr
+    result = run_size(size, fixtures_dir)
+    sys.stdout = real_stdout
+    print(json.dumps(result))
+
+# ============================
+# Driver
+# ============================
+def git_commit():
+    try:
+        return subprocess.run(["git", "-C", REPO_DIR, "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+def last_result(sizes):
+    try:
+        with open(RESULTS_FILE, encoding="utf-8") as f:
+            runs = [json.loads(line) for line in f if line.strip()]
+    except OSError:
+        return None
+    runs = [r for r in runs if set(sizes) <= set(r["results"])]
+    return runs[-1] if runs else None
+
+def print_results(results, previous):
+    print(f"{'tracks':>8} {'stage':<18} {'seconds':>9} {'peak RSS':>10}  vs last")
+    for size, result in results.items():
+        for name, s in result["stages"].items():
+            delta = ""
+            if previous and name in previous["results"].get(size, {}).get("stages", {}):
+                before = previous["results"][size]["stages"][name]["s"]
+                if before: delta = f"{(s['s'] - before) / before * 100:+.0f}%"
+            print(f"{size:>8} {name:<18} {s['s']:>9.3f} {s['peak_rss_mb']:>8.1f}MB  {delta}")
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end parse/ingest/render benchmark")
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--record", nargs="+", metavar="URL")
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child_main(args.child, args.fixtures)
+
+    if args.record:
+        return replay.record(args.record, args.fixtures)
+
+    fixtures_dir = args.fixtures
+    if not replay.fixture_chart_urls(fixtures_dir):
+        fixtures_dir = tempfile.mkdtemp(prefix="bench-fixtures-")
+        replay.write_synthetic_fixtures(fixtures_dir)
+        print(f"📼 No recorded fixtures, using synthetic pages in {fixtures_dir}")
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    results = {}
+    for size in sizes:
+        print(f"⏱️  {size} tracks ...")
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", str(size), "--fixtures", fixtures_dir],
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            sys.exit(f"❌ {size}-track run failed:\n{proc.stderr[-2000:]}")
+        results[str(size)] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    previous = last_result(results)
+    print_results(results, previous)
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        run = {
+            "at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "env": {k: os.environ[k] for k in ("PIPELINE", "PARSER_BACKEND", "CHART_EXTRACT") if k in os.environ},
+            "results": results,
+        }
+        with open(RESULTS_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(run) + "\n")
+        print(f"💾 Saved to {os.path.relpath(RESULTS_FILE)}")
+
+if __name__ == "__main__":
+    main()
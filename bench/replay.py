@@ -0,0 +1,165 @@
+# ============================
+# Offline replay: recorded Beatport pages served from a fixture directory
+#
+# Fixture layout mirrors the site's URL paths:
+#   <fixtures>/chart/<slug>/<id>.html   chart pages
+#   <fixtures>/label/<slug>/<id>.html   label pages
+#
+# ReplayAdapter is mounted on the shared requests session, so fetch_html,
+# the HTTP cache and both ingest pipelines run unchanged without network.
+# ============================
+import hashlib
+import json
+import os
+import random
+
+import requests
+import requests.adapters
+
+from beatracks.fetch import get_session
+from beatracks.parse import parse_chart_page
+
+BEATPORT = "https://www.beatport.com"
+
+# ============================
+# Transport
+# ============================
+class ReplayAdapter(requests.adapters.BaseAdapter):
+    def __init__(self, fixtures_dir):
+        super().__init__()
+        self.fixtures_dir = fixtures_dir
+        self.requests = 0
+
+    def send(self, request, **kwargs):
+        self.requests += 1
+        path = requests.utils.urlparse(request.url).path.strip("/")
+        response = requests.models.Response()
+        response.url = request.url
+        response.request = request
+        response.encoding = "utf-8"
+        try:
+            with open(os.path.join(self.fixtures_dir, path + ".html"), "rb") as f:
+                body = f.read()
+        except OSError:
+            response.status_code = 404
+            response._content = b""
+            return response
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        response.headers["ETag"] = etag
+        if request.headers.get("If-None-Match") == etag:
+            response.status_code = 304
+            response._content = b""
+        else:
+            response.status_code = 200
+            response._content = body
+        return response
+
+    def close(self):
+        pass
+
+def install(fixtures_dir):
+    adapter = ReplayAdapter(fixtures_dir)
+    get_session().mount(BEATPORT, adapter)
+    return adapter
+
+def fixture_chart_urls(fixtures_dir):
+    urls = []
+    chart_dir = os.path.join(fixtures_dir, "chart")
+    for slug in sorted(os.listdir(chart_dir)) if os.path.isdir(chart_dir) else []:
+        for name in sorted(os.listdir(os.path.join(chart_dir, slug))):
+            if name.endswith(".html"):
+                urls.append(f"{BEATPORT}/chart/{slug}/{name[:-5]}")
+    return urls
+
+def save_fixture(fixtures_dir, url, html):
+    path = os.path.join(fixtures_dir, requests.utils.urlparse(url).path.strip("/") + ".html")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(html)
+
+def record(urls, fixtures_dir):
+    # Save live chart pages and the label pages they link to
+    for url in urls:
+        html = get_session().get(url, timeout=10).text
+        save_fixture(fixtures_dir, url, html)
+        _, _, tracks = parse_chart_page(html)
+        labels = {t["label_href"] for t in tracks if t["label_href"]}
+        for href in sorted(labels):
+            save_fixture(fixtures_dir, BEATPORT + href, get_session().get(BEATPORT + href, timeout=10).text)
+        print(f"📼 {url}: {len(tracks)} tracks, {len(labels)} label pages")
+
+# ============================
+# Synthetic pages in Beatport's markup (DOM rows plus embedded __NEXT_DATA__)
+# ============================
+LABELS = 40
+GENRES = ["Tech House", "Melodic House & Techno", "Afro House", "Deep House", "Techno (Peak Time / Driving)",
+          "Progressive House", "Indie Dance", "Minimal / Deep Tech", "House", "Organic House", "Trance", "Drum & Bass"]
+
+def synthetic_track(i):
+    return {
+        "id": i,
+        "artist": f"Artist {i % 50}, Guest {i % 13}",
+        "title": f"Track {i} Original Mix",
+        "genre": GENRES[i % len(GENRES)],
+        "label": f"Label {i % LABELS}",
+        "label_href": f"/label/label-{i % LABELS}/{i % LABELS}",
+        "artwork": f"https://geo-media.beatport.com/image_size/95x95/{i}.jpg",
+        "release": f"2026-02-{i % 28 + 1:02d}",
+    }
+
+def synthetic_row(t):
+    artists = ", ".join(f'<a href="/artist/a/{n}">{name}</a>' for n, name in enumerate(t["artist"].split(", ")))
+    name, mix = t["title"].rsplit(" ", 2)[0], " ".join(t["title"].rsplit(" ", 2)[1:])
+    return f"""<div class="Table-style__TableRow-sc-1 row">
+<div class="Table-style__TableCell-sc-1 cell title"><a class="artwork" href="/track/t/{t['id']}"><img src="{t['artwork']}"></a>
+<div class="container"><div class="Lists-shared-style__Title-sc title"><a href="/track/t/{t['id']}"><span>{name} <span>{mix}</span></span></a></div>
+<div class="ArtistsNames-sc ArtistNames">{artists}</div></div></div>
+<div class="Table-style__TableCell-sc-1 cell label"><a href="{t['label_href']}">{t['label']}</a></div>
+<div class="Table-style__TableCell-sc-1 cell bpm"><div>{t['genre']}</div><div>124 BPM</div></div>
+<div class="Table-style__TableCell-sc-1 cell date">{t['release']}</div>
+</div>"""
+
+def synthetic_item(t):
+    name, mix = t["title"].rsplit(" ", 2)[0], " ".join(t["title"].rsplit(" ", 2)[1:])
+    slug, label_id = t["label_href"].split("/")[2:]
+    return {
+        "id": t["id"], "name": name, "mix_name": mix,
+        "artists": [{"name": a} for a in t["artist"].split(", ")], "remixers": [],
+        "genre": {"name": t["genre"]}, "sub_genre": None,
+        "new_release_date": t["release"],
+        "release": {
+            "image": {"dynamic_uri": t["artwork"].replace("95x95", "{w}x{h}")},
+            "label": {"id": int(label_id), "name": t["label"], "slug": slug,
+                      "image": {"dynamic_uri": f"https://geo-media.beatport.com/image_size/{{w}}x{{h}}/label-{label_id}.jpg"}},
+        },
+    }
+
+def synthetic_chart_page(tracks, date="2026-03-01", embed_json=True):
+    next_data = ""
+    if embed_json:
+        data = {"props": {"pageProps": {"dehydratedState": {"queries": [
+            {"state": {"data": {"name": "Chart", "track_count": len(tracks), "publish_date": date,
+                                "image": {"dynamic_uri": "https://geo-media.beatport.com/image_size/{w}x{h}/chart.jpg"}}}},
+            {"state": {"data": {"results": [synthetic_item(t) for t in tracks]}}},
+        ]}}}}
+        next_data = f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(data)}</script>'
+    rows = "".join(synthetic_row(t) for t in tracks)
+    return f"""<html><head>{next_data}</head><body>
+<div class="ChartDetailCard-style__ImageWrapper-sc"><img src="https://geo-media.beatport.com/image_size/500x500/chart.jpg"></div>
+<div class="ChartDetailCard-style__Info-sc"><p>Date Created</p><span>{date}</span></div>
+{rows}</body></html>"""
+
+def synthetic_label_page(label_id):
+    return f"""<html><body><div class="LabelDetail"><img alt="Label {label_id}"
+src="https://geo-media.beatport.com/image_size/87x87/label-{label_id}.jpg"></div></body></html>"""
+
+def write_synthetic_fixtures(fixtures_dir, charts=10, tracks_per_chart=100, seed=1):
+    # Charts overlap by ~20% so duplicate marking has work to do
+    rng = random.Random(seed)
+    pool = charts * tracks_per_chart * 4 // 5
+    for n in range(charts):
+        ids = rng.sample(range(pool), tracks_per_chart)
+        html = synthetic_chart_page([synthetic_track(i) for i in ids], f"2026-04-{n % 28 + 1:02d}")
+        save_fixture(fixtures_dir, f"{BEATPORT}/chart/bench-chart-{n:03d}/{9000 + n}", html)
+    for label_id in range(LABELS):
+        save_fixture(fixtures_dir, f"{BEATPORT}/label/label-{label_id}/{label_id}", synthetic_label_page(label_id))
@@ -0,0 +1,79 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from beatracks import store
+
+# ============================
+# Schema migrations and per-release track rows (python -m unittest discover tests)
+# ============================
+LEGACY_COLUMNS = ("id, chart_name, chart_date_created, chart_image, artist, title, url, genre, label, label_img, "
+                  "artwork, release_dt, release_str, is_duplicate, created_at")
+LEGACY_ROWS = [
+    (1, "week-1", "2024-01-01", "c1.jpg", "A", "Song", "https://www.beatport.com/chart/week-1/1", "House",
+     "L1", "l1.jpg", "a1.jpg", "2023-12-01", "Dec 1, 2023", 0, "2024-01-01 10:00:00"),
+    (2, "week-1", "2024-01-01", "c1.jpg", "B", "Tune", "https://www.beatport.com/chart/week-1/1", "Techno",
+     "L2", "l2.jpg", "a2.jpg", "2023-12-02", "Dec 2, 2023", 0, "2024-01-01 10:00:01"),
+    (3, "week-2", "2024-01-08", "c2.jpg", "A", "Song", "https://www.beatport.com/chart/week-2/2", "House",
+     "L1", "l1.jpg", "a1.jpg", "2023-12-01", "Dec 1, 2023", 1, "2024-01-08 10:00:00"),
+    (4, "week-2", "2024-01-08", "c2.jpg", "C", "Other", "https://www.beatport.com/chart/week-2/2", "House",
+     "L1", "l1.jpg", "a3.jpg", "2024-01-02", "Jan 2, 2024", 0, "2024-01-08 10:00:01"),
+]
+
+def track(beatport_id, label, artwork):
+    return {"artist": "A", "title": "Song", "genre": "House", "label": label, "label_img": "", "artwork": artwork,
+            "release_dt": None, "release_str": "", "beatport_id": beatport_id}
+
+class StoreMigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "test.db")
+        self.saved_conn = store.conn
+
+    def tearDown(self):
+        if store.conn is not self.saved_conn:
+            store.conn.close()
+        store.conn = self.saved_conn
+        self.tmp.cleanup()
+
+    def test_v1_weekly_links_survive_migration(self):
+        legacy = sqlite3.connect(self.path)
+        legacy.execute("""
+        CREATE TABLE weekly_links (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, chart_name TEXT, chart_date_created TEXT, chart_image TEXT,
+            artist TEXT, title TEXT, url TEXT, genre TEXT, label TEXT, label_img TEXT, artwork TEXT,
+            release_dt TEXT, release_str TEXT, is_duplicate INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+        legacy.executemany(f"INSERT INTO weekly_links ({LEGACY_COLUMNS}) VALUES ({','.join('?' * 15)})", LEGACY_ROWS)
+        legacy.commit()
+        legacy.close()
+
+        conn = store.open_db(self.path)
+        self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], len(store.SCHEMA_MIGRATIONS))
+        rows = conn.execute(f"SELECT {LEGACY_COLUMNS} FROM weekly_links ORDER BY id").fetchall()
+        self.assertEqual(rows, LEGACY_ROWS)
+        self.assertEqual([dup for (dup,) in conn.execute("SELECT is_duplicate FROM weekly_links ORDER BY id")], [0, 0, 1, 0])
+        # The same artist/title in two charts is one tracks row
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0], 3)
+
+    def test_same_title_on_two_releases(self):
+        conn = store.open_db(self.path)
+        store.add_tracks_to_db("week-1", "2024-01-01", "", "https://www.beatport.com/chart/week-1/1",
+                               [track(101, "Original Label", "single.jpg")])
+        store.add_tracks_to_db("week-2", "2024-01-08", "", "https://www.beatport.com/chart/week-2/2",
+                               [track(202, "Compilation Label", "compilation.jpg")])
+        tracks = conn.execute("""
+            SELECT t.beatport_id, l.name, t.artwork, t.identity FROM tracks t JOIN labels l ON l.id=t.label_id
+            ORDER BY t.beatport_id
+        """).fetchall()
+        self.assertEqual([row[:3] for row in tracks],
+                         [(101, "Original Label", "single.jpg"), (202, "Compilation Label", "compilation.jpg")])
+        self.assertEqual(tracks[0][3], tracks[1][3])
+        flags = conn.execute("SELECT chart_name, label, is_duplicate FROM weekly_links ORDER BY id").fetchall()
+        self.assertEqual(flags, [("week-1", "Original Label", 0), ("week-2", "Compilation Label", 1)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+from beatracks.store import track_identity
+
+# ============================
+# Track identity keys (python -m unittest discover tests)
+# ============================
+class TrackIdentityTest(unittest.TestCase):
+    def assertSame(self, a, b):
+        self.assertEqual(track_identity(*a), track_identity(*b))
+
+    def assertDifferent(self, a, b):
+        self.assertNotEqual(track_identity(*a), track_identity(*b))
+
+    def test_feat_in_artist_or_title(self):
+        self.assertSame(("A feat. B", "Song"), ("A", "Song (feat. B)"))
+        self.assertSame(("A feat. B", "Song"), ("A", "Song feat. B"))
+        self.assertSame(("A ft. B", "Song"), ("A", "Song [Featuring B]"))
+        self.assertSame(("A feat. B", "Song (Extended Mix)"), ("A", "Song feat. B Extended Mix"))
+        self.assertSame(("A feat. B", "Song (Extended Mix)"), ("A", "Song feat. B (Extended Mix)"))
+
+    def test_unbracketed_feat_keeps_the_mix(self):
+        self.assertDifferent(("A", "Song feat. B (Extended Mix)"), ("A", "Song (Original Mix)"))
+        self.assertDifferent(("A", "Song feat. B (Extended Mix)"), ("A", "Song feat. B"))
+        self.assertDifferent(("A", "Song feat. B (C Remix)"), ("A", "Song feat. B (D Remix)"))
+        self.assertEqual(track_identity("A", "Song feat. B (Extended Mix)"), "a,b|song extended mix")
+
+    def test_featured_artist_is_not_dropped(self):
+        self.assertDifferent(("A", "Song (feat. B)"), ("A", "Song"))
+
+    def test_spelling_and_order(self):
+        self.assertSame(("Beyoncé & Jay-Z", "Déjà Vu (Original Mix)"), ("JAY Z, Beyonce", "Deja Vu"))
+        self.assertSame(("Malaa x Tchami", "Prophecy"), ("Tchami, Malaa", "Prophecy"))
+        self.assertDifferent(("A", "Song (Original Mix)"), ("A", "Song (Extended Mix)"))
+        self.assertDifferent(("A", "Song"), ("A", "Song (B Remix)"))
+
+    def test_ft_as_a_word(self):
+        self.assertEqual(track_identity("A", "Six ft Under"), "a|six ft under")
+        self.assertEqual(track_identity("Six ft Under", "Song"), "six ft under|song")
+        self.assertSame(("A ft. B", "Song"), ("A", "Song ft. B"))
+        self.assertSame(("A ft. B", "Song"), ("A", "Song (ft B)"))
+
+    def test_artist_named_x(self):
+        self.assertEqual(track_identity("X", "One"), "x|one")
+
+if __name__ == "__main__":
+    unittest.main()